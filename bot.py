@@ -1,9 +1,17 @@
 import os
+import asyncio
 import logging
 import logging.config
 from pyrogram import Client
 from config import *
-from plugins.Post.Posting import restore_pending_deletions
+from plugins.Post.Posting import restore_pending_deletions, resume_unfinished_posts
+from plugins.helper.rate_limiter import RateLimiter
+from plugins.helper.scheduler import scheduler
+from plugins.helper.log_queue import log_queue
+from plugins.helper.user_session import user_sessions
+from plugins.helper.db import db
+from plugins.Extra.broadcast import resume_broadcasts, restore_broadcast_deletions, flush_deletion_recorders
+from plugins.Post.Invite_link import restore_invite_revocations
 
 # Support multiple admin IDs
 ADMIN_IDS = [int(x) for x in os.environ.get("AMIT", "2031106491").split()]
@@ -22,8 +30,15 @@ class Bot(Client):
             workers=50,
             plugins={"root": "plugins"},
             sleep_threshold=5,
+            # pyrogram uploads one file at a time unless told otherwise
+            max_concurrent_transmissions=RESTRICTED_UPLOADS,
         )
         self.admin_panel = None  # Initialize as None first
+        self.limiter = RateLimiter()  # Shared by every plugin, see plugins/helper/rate_limiter.py
+
+    async def invoke(self, query, *args, **kwargs):
+        # Every API call made by the bot passes through the limiter
+        return await self.limiter.invoke(super().invoke, query, *args, **kwargs)
 
     async def start(self):
         await super().start()
@@ -31,7 +46,19 @@ class Bot(Client):
         self.mention = me.mention
         self.username = me.username
 
+        await db.ensure_indexes()
+        await db.load_admins()
+        await db.load_channels()
+        db.start_channel_sync()
         await restore_pending_deletions(self)
+        await restore_broadcast_deletions()
+        await restore_invite_revocations()
+        scheduler.start(self)
+        log_queue.start(self)
+        await user_sessions.start()
+        # Finish any /post or /fpost fan-out a restart interrupted
+        asyncio.create_task(resume_unfinished_posts(self))
+        await resume_broadcasts(self)
 
         logging.info(f"{me.first_name} ✅✅ BOT started successfully ✅✅")
         logging.info(f"{me.first_name} Pending deletions restored successfully.")
@@ -48,6 +75,9 @@ class Bot(Client):
                 logging.warning(f"Failed to send restart notification to {admin_id}: {e}")
 
     async def stop(self, *args):
+        await flush_deletion_recorders()
+        await log_queue.flush()
+        await user_sessions.stop()
         await super().stop()
         logging.info("Bot Stopped 🙄")
 
@@ -23,3 +23,33 @@ LOG_CHANNEL = int(os.environ.get("LOG_CHANNEL", "-1002027394591"))
 
 REACTIONS = ["🤝", "😇", "🤗", "😍", "🎅", "🥰", "🤩", "😘", "😛", "😈", "🎉", "🫡", "😎", "🔥", "🤭", "🌚", "🆒", "👻", "😁"] #don't add any emoji because tg not support all emoji reactions
 
+
+# Performance tuning
+FANOUT_CONCURRENCY = int(os.environ.get("FANOUT_CONCURRENCY", "20"))  # Channels posted to in parallel
+GLOBAL_RATE_LIMIT = int(os.environ.get("GLOBAL_RATE_LIMIT", "25"))  # Bot API calls per second, all chats
+CHAT_RATE_LIMIT = float(os.environ.get("CHAT_RATE_LIMIT", "1"))  # Sends per second into a single chat
+FLOOD_RETRY_THRESHOLD = int(os.environ.get("FLOOD_RETRY_THRESHOLD", "60"))  # FloodWaits up to this many seconds are waited out and retried
+POST_RETRY_ATTEMPTS = int(os.environ.get("POST_RETRY_ATTEMPTS", "5"))  # Background retries for a channel that failed during a post
+POST_RETRY_DELAY = int(os.environ.get("POST_RETRY_DELAY", "10"))  # First retry backoff in seconds, doubled on every attempt
+DELETE_BATCH_WINDOW = float(os.environ.get("DELETE_BATCH_WINDOW", "2"))  # Seconds to gather due auto-deletes into one batch
+CATCHUP_BATCH = int(os.environ.get("CATCHUP_BATCH", "50"))  # Overdue posts deleted per catch-up step on startup
+CATCHUP_INTERVAL = float(os.environ.get("CATCHUP_INTERVAL", "5"))  # Seconds between catch-up steps
+ADMIN_CACHE_TTL = int(os.environ.get("ADMIN_CACHE_TTL", "60"))  # Seconds before the in-memory admin set is reloaded from the database
+CHANNEL_POLL_INTERVAL = int(os.environ.get("CHANNEL_POLL_INTERVAL", "60"))  # Channel registry resync interval when change streams are unavailable
+SLOW_QUERY_MS = int(os.environ.get("SLOW_QUERY_MS", "100"))  # Database commands slower than this are recorded for /dbstats
+BROADCAST_WORKERS = int(os.environ.get("BROADCAST_WORKERS", "20"))  # Concurrent sends during /broadcast, the rate limiter caps the actual rate
+USER_COUNT_TTL = int(os.environ.get("USER_COUNT_TTL", "300"))  # Seconds before the cached user total is re-estimated from the database
+KNOWN_USERS_MAX = int(os.environ.get("KNOWN_USERS_MAX", "1000000"))  # Registered user ids kept in memory to skip the database on /start
+LOG_FLUSH_INTERVAL = float(os.environ.get("LOG_FLUSH_INTERVAL", "10"))  # Seconds of LOG_CHANNEL events grouped into one digest
+LOG_QUEUE_MAX = int(os.environ.get("LOG_QUEUE_MAX", "1000"))  # Pending log events kept before the oldest are dropped
+INVITE_REUSE_RATIO = float(os.environ.get("INVITE_REUSE_RATIO", "0.5"))  # /genlink reuses a cached link while this share of its lifetime remains
+FSUB_CHAT_TTL = int(os.environ.get("FSUB_CHAT_TTL", "3600"))  # Seconds force-sub channel titles and invite links are cached
+FSUB_MEMBER_TTL = int(os.environ.get("FSUB_MEMBER_TTL", "600"))  # Seconds a confirmed force-sub membership is trusted
+USER_SESSION_POOL_SIZE = int(os.environ.get("USER_SESSION_POOL_SIZE", "1"))  # Connections opened with SESSION_STRING for restricted content
+USER_SESSION_HEALTH_INTERVAL = int(os.environ.get("USER_SESSION_HEALTH_INTERVAL", "300"))  # Seconds between user session health checks
+PROGRESS_INTERVAL = float(os.environ.get("PROGRESS_INTERVAL", "3"))  # Seconds between download/upload status edits
+RESTRICTED_DOWNLOADS = int(os.environ.get("RESTRICTED_DOWNLOADS", "3"))  # Restricted files downloading at once per batch (also the user session transfer limit)
+RESTRICTED_UPLOADS = int(os.environ.get("RESTRICTED_UPLOADS", "2"))  # Restricted files uploading at once per batch (also the bot-wide upload limit)
+RESTRICTED_DISK_LIMIT_MB = int(os.environ.get("RESTRICTED_DISK_LIMIT_MB", "4096"))  # Downloaded restricted media kept on disk at once
+PARALLEL_DOWNLOAD_PARTS = int(os.environ.get("PARALLEL_DOWNLOAD_PARTS", "4"))  # Byte ranges fetched at once for large restricted media
+PARALLEL_DOWNLOAD_MIN_MB = int(os.environ.get("PARALLEL_DOWNLOAD_MIN_MB", "20"))  # Smaller files download as a single stream
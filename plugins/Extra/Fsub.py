@@ -1,28 +1,86 @@
-from pyrogram import Client, filters
+import asyncio
+import logging
+import time
+from pyrogram import Client, filters, enums
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.errors import UserNotParticipant
-from config import AUTH_CHANNEL
+from config import AUTH_CHANNEL, FORCE_PIC, FSUB_CHAT_TTL, FSUB_MEMBER_TTL
+
+logger = logging.getLogger(__name__)
 
 #=====================================================================================
 
+# chat_id -> (title, invite_link, fetched_at)
+chat_info = {}
+# (chat_id, user_id) -> time the user was last confirmed as a member.
+# Only positive results are kept, so a user who just joined is never told to join again.
+members = {}
+MEMBER_STATUSES = (enums.ChatMemberStatus.MEMBER, enums.ChatMemberStatus.ADMINISTRATOR, enums.ChatMemberStatus.OWNER)
+
+
+async def get_chat_info(bot, chat_id):
+    cached = chat_info.get(chat_id)
+    if cached and time.time() - cached[2] < FSUB_CHAT_TTL:
+        return cached
+    chat = await bot.get_chat(chat_id)
+    chat_info[chat_id] = (chat.title, chat.invite_link, time.time())
+    return chat_info[chat_id]
+
+
+def remember_member(chat_id, user_id):
+    if len(members) >= 100000:
+        # Drop expired entries before growing further
+        now = time.time()
+        for key in [key for key, checked in members.items() if now - checked >= FSUB_MEMBER_TTL]:
+            del members[key]
+    members[(chat_id, user_id)] = time.time()
+
+
+async def check_channel(bot, chat_id, user_id):
+    """Return a join button if the user is not in the channel, else None"""
+    checked = members.get((chat_id, user_id))
+    if checked and time.time() - checked < FSUB_MEMBER_TTL:
+        return None
+    try:
+        member = await bot.get_chat_member(chat_id, user_id)
+    except UserNotParticipant:
+        member = None
+    except Exception as e:
+        logger.error(f"Error checking {user_id} in {chat_id}: {e}")
+        return None
+
+    if member and member.status in MEMBER_STATUSES:
+        remember_member(chat_id, user_id)
+        return None
+    # Not in the channel, or left, banned or restricted
+    title, invite_link, _ = await get_chat_info(bot, chat_id)
+    return [InlineKeyboardButton(f'🛸 Join {title} 🛸', url=invite_link)]
+
+
 async def is_subscribed(bot, query, channel):
-    btn = []
-    for id in channel:
-        chat = await bot.get_chat(int(id))
-        try:
-            await bot.get_chat_member(id, query.from_user.id)
-        except UserNotParticipant:
-            btn.append([InlineKeyboardButton(f'🛸 Join {chat.title} 🛸', url=chat.invite_link)])
-        except Exception as e:
-            print(e)
-    return btn
+    results = await asyncio.gather(*(check_channel(bot, int(id), query.from_user.id) for id in channel))
+    return [button for button in results if button]
+
+
+@Client.on_chat_member_updated(filters.chat(AUTH_CHANNEL), group=1)
+async def track_membership(client, update):
+    """Keep the membership cache in step with joins and leaves in the force-sub channels"""
+    member = update.new_chat_member or update.old_chat_member
+    if not member or not member.user:
+        return
+    key = (update.chat.id, member.user.id)
+    if update.new_chat_member and update.new_chat_member.status in MEMBER_STATUSES:
+        remember_member(*key)
+    else:
+        members.pop(key, None)
+
 
 def auth_check(func):
     async def wrapper(client, message):
         if AUTH_CHANNEL:
             btn = await is_subscribed(client, message, AUTH_CHANNEL)
             if btn:
-                username = (await client.get_me()).username
+                username = getattr(client, "username", None) or (await client.get_me()).username
                 start_param = message.command[1] if len(message.command) > 1 else "true"
                 btn.append([InlineKeyboardButton("🔄 Rᴇғʀᴇsʜ 🔄", url=f"https://t.me/{username}?start={start_param}")])
 
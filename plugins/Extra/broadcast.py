@@ -2,12 +2,13 @@ import os
 import time
 import asyncio
 import logging
-import datetime
 from config import ADMIN
 from plugins.helper.db import db
+from plugins.helper.broadcast_engine import start_broadcast, running
+from plugins.helper.scheduler import scheduler
+from plugins.helper.batch_delete import delete_in_batches
 from pyrogram.types import Message
 from pyrogram import Client, filters
-from pyrogram.errors import FloodWait, InputUserDeactivated, UserIsBlocked, PeerIdInvalid
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -18,107 +19,169 @@ async def get_stats(bot: Client, message: Message):
     total_users = await db.total_users_count()
     await mr.edit(text=f"**❤️‍🔥 TOTAL USERS = {total_users}**")
 
+BROADCAST_DELETION = "broadcast_deletion"
+DELETION_BUCKET = 10  # Seconds of /dbroadcast expiries handled by one scheduler entry
+DELETION_FLUSH_INTERVAL = 2  # Seconds a sent copy waits at most before its deletion is stored
+
+async def new_broadcast_job(broadcast_msg, sts_msg, delete_after=None):
+    job = {
+        "_id": int(time.time() * 1000),
+        "from_chat_id": broadcast_msg.chat.id,
+        "message_id": broadcast_msg.id,
+        "status": "running",
+        "total": await db.total_users_count(),
+        "started_at": time.time(),
+        "status_chat_id": sts_msg.chat.id,
+        "status_msg_id": sts_msg.id
+    }
+    if delete_after:
+        job["delete_after"] = delete_after
+    await db.create_broadcast(job)
+    return job
+
+async def launch_broadcast(bot, job):
+    """Start a broadcast, recording every copy for deletion when it is a /dbroadcast"""
+    if job.get("delete_after"):
+        recorder = DeletionRecorder(job)
+        return await start_broadcast(bot, job, on_sent=recorder.add, on_done=recorder.close)
+    return await start_broadcast(bot, job)
+
 @Client.on_message(filters.command("broadcast") & filters.user(ADMIN) & filters.reply)
 async def broadcast_handler(bot: Client, m: Message):
-    all_users = await db.get_all_users()
-    broadcast_msg = m.reply_to_message
     sts_msg = await m.reply_text("Broadcast started!")
-    
-    done, failed, success = 0, 0, 0
-    start_time = time.time()
-    total_users = await db.total_users_count()
+    job = await new_broadcast_job(m.reply_to_message, sts_msg)
+    await launch_broadcast(bot, job)
 
-    async for user in all_users:
-        sts = await send_msg(bot, user['_id'], broadcast_msg)
-        if sts == 200:
-            success += 1
-        else:
-            failed += 1
-        if sts == 400:
-            await db.delete_user(user['_id'])
-
-        done += 1
-        if not done % 20:
-            await sts_msg.edit(
-                f"**Broadcast in progress:\nTotal Users: {total_users}\nCompleted: {done} / {total_users}\nSuccess: {success}\nFailed: {failed}**"
-            )
-
-    completed_in = datetime.timedelta(seconds=int(time.time() - start_time))
-    await sts_msg.edit(
-        f"**Broadcast Completed:\nCompleted in `{completed_in}`.\n\nTotal Users: {total_users}\nCompleted: {done} / {total_users}\nSuccess: {success}\nFailed: {failed}**"
-    )
-
-async def send_msg(bot, user_id, message):
+@Client.on_message(filters.command("cancel_broadcast") & filters.user(ADMIN))
+async def cancel_broadcast(bot: Client, m: Message):
+    if not running:
+        return await m.reply_text("**No broadcast is running.**")
+    for broadcast in list(running.values()):
+        broadcast.cancel()
+    await m.reply_text(f"**Cancelling {len(running)} broadcast(s)...**")
+
+@Client.on_message(filters.command("resume_broadcast") & filters.user(ADMIN))
+async def resume_broadcast(bot: Client, m: Message):
+    cancelled = await db.get_broadcasts("cancelled") + await db.get_broadcasts("failed")
+    cancelled.sort(key=lambda job: job["_id"], reverse=True)
+    if len(m.command) > 1:
+        cancelled = [job for job in cancelled if str(job["_id"]) == m.command[1]]
+    if not cancelled:
+        return await m.reply_text("**No cancelled or failed broadcast to resume.**")
+
+    job = cancelled[0]
+    sts_msg = await m.reply_text("Broadcast resumed!")
+    job.update({"status": "running", "status_chat_id": sts_msg.chat.id, "status_msg_id": sts_msg.id})
+    await db.update_broadcast(job["_id"], {
+        "status": "running",
+        "status_chat_id": sts_msg.chat.id,
+        "status_msg_id": sts_msg.id
+    })
+    await launch_broadcast(bot, job)
+
+async def resume_broadcasts(bot):
+    """Restart broadcasts that were still running when the bot went down"""
     try:
-        await message.copy(chat_id=int(user_id))
-        return 200
-    except FloodWait as e:
-        await asyncio.sleep(e.value)
-        return await send_msg(bot, user_id, message)
-    except InputUserDeactivated:
-        logger.info(f"{user_id} : deactivated")
-        return 400
-    except UserIsBlocked:
-        logger.info(f"{user_id} : blocked the bot")
-        return 400
-    except PeerIdInvalid:
-        logger.info(f"{user_id} : user id invalid")
-        return 400
+        for job in await db.get_broadcasts("running"):
+            logger.info(f"Resuming broadcast {job['_id']} after user {job.get('checkpoint')}")
+            await launch_broadcast(bot, job)
     except Exception as e:
-        logger.error(f"{user_id} : {e}")
-        return 500
+        logger.error(f"Error resuming broadcasts: {e}")
 
 @Client.on_message(filters.private & filters.command('dbroadcast') & filters.user(ADMIN) & filters.reply)
 async def delete_broadcast(bot: Client, message: Message):
     if message.reply_to_message:
         try:
             duration = int(message.command[1])  # Get duration in seconds
+            if duration <= 0:
+                raise ValueError
         except (IndexError, ValueError):
             await message.reply("<b>Please provide a valid duration in seconds.</b>\nUsage: /dbroadcast {duration}")
             return
 
-        all_users = await db.get_all_users()  # Fetch users from the database
-        broadcast_msg = message.reply_to_message
-        total, successful, blocked, deleted, unsuccessful = 0, 0, 0, 0, 0
-
         pls_wait = await message.reply("<i>Broadcast with auto-delete processing...</i>")
-        
-        async for user in all_users:
-            chat_id = user["_id"]
+        job = await new_broadcast_job(message.reply_to_message, pls_wait, delete_after=duration)
+        await launch_broadcast(bot, job)
+
+    else:
+        msg = await message.reply("Please reply to a message to broadcast it with auto-delete.")
+        await asyncio.sleep(8)
+        await msg.delete()
+
+recorders = set()  # Running DeletionRecorders, flushed on shutdown
+
+class DeletionRecorder:
+    """
+    Persists the copies sent by a /dbroadcast with their expiry, in batches.
+    A background task flushes every DELETION_FLUSH_INTERVAL seconds, so nothing waits
+    on the next send, e.g. while the broadcast lane sits out a FloodWait.
+    """
+
+    def __init__(self, job):
+        self.job = job
+        self.pending = []
+        self._task = asyncio.create_task(self._flush_periodically())
+        recorders.add(self)
+
+    async def add(self, user_id, sent_msg):
+        self.pending.append({
+            "broadcast_id": self.job["_id"],
+            "chat_id": int(user_id),
+            "message_id": sent_msg.id,
+            "delete_at": time.time() + self.job["delete_after"]
+        })
+        if len(self.pending) >= 100:
+            await self.flush()
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(DELETION_FLUSH_INTERVAL)
             try:
-                sent_msg = await broadcast_msg.copy(chat_id)
-                await asyncio.sleep(duration)  # Wait for the duration
-                await sent_msg.delete()  # Delete message after the duration
-                successful += 1
-            except FloodWait as e:
-                await asyncio.sleep(e.value)
-                sent_msg = await broadcast_msg.copy(chat_id)
-                await asyncio.sleep(duration)
-                await sent_msg.delete()
-                successful += 1
-            except UserIsBlocked:
-                await db.delete_user(chat_id)  # Remove blocked users
-                blocked += 1
-            except InputUserDeactivated:
-                await db.delete_user(chat_id)  # Remove deactivated users
-                deleted += 1
+                await self.flush()
             except Exception as e:
-                logger.error(f"Error broadcasting to {chat_id}: {e}")
-                unsuccessful += 1
-                pass
-            total += 1
+                logger.error(f"Error storing broadcast deletions: {e}")
 
-        status = f"""<b><u>Broadcast with Auto-Delete Completed</u></b>
+    async def close(self):
+        self._task.cancel()
+        recorders.discard(self)
+        await self.flush()
 
-Total Users: <code>{total}</code>
-Successful: <code>{successful}</code>
-Blocked Users: <code>{blocked}</code>
-Deleted Accounts: <code>{deleted}</code>
-Unsuccessful: <code>{unsuccessful}</code>"""
+    async def flush(self):
+        pending, self.pending = self.pending, []
+        if not pending:
+            return
+        await db.add_broadcast_deletions(pending)
+        # Scheduled only once stored, so the handler always finds what it was woken for
+        for deletion in pending:
+            schedule_broadcast_deletion(deletion["delete_at"])
 
-        await pls_wait.edit(status)
+async def flush_deletion_recorders():
+    """Store every recorded /dbroadcast copy before the bot stops"""
+    for recorder in list(recorders):
+        try:
+            await recorder.flush()
+        except Exception as e:
+            logger.error(f"Error storing broadcast deletions on shutdown: {e}")
 
-    else:
-        msg = await message.reply("Please reply to a message to broadcast it with auto-delete.")
-        await asyncio.sleep(8)
-        await msg.delete()
+def schedule_broadcast_deletion(delete_at):
+    bucket = int(delete_at // DELETION_BUCKET) + 1
+    scheduler.schedule(BROADCAST_DELETION, bucket, bucket * DELETION_BUCKET)
+
+async def delete_due_broadcast_messages(bot, buckets):
+    """Scheduler handler: delete every /dbroadcast copy whose time is up"""
+    while True:
+        due = await db.get_due_broadcast_deletions(time.time())
+        if not due:
+            break
+        await delete_in_batches(bot, [(d["chat_id"], d["message_id"]) for d in due])
+        await db.remove_broadcast_deletions([d["_id"] for d in due])
+
+scheduler.register(BROADCAST_DELETION, delete_due_broadcast_messages)
+
+async def restore_broadcast_deletions():
+    """Re-schedule /dbroadcast deletions that were pending when the bot went down"""
+    try:
+        async for delete_at in db.iter_broadcast_deletion_times():
+            schedule_broadcast_deletion(delete_at)
+    except Exception as e:
+        logger.error(f"Error restoring broadcast deletions: {e}")
@@ -2,7 +2,7 @@ import os
 import asyncio
 from pyrogram import Client, filters, enums
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ChatPrivileges
-from pyrogram.errors import UserAlreadyParticipant, ChatAdminRequired, UserNotParticipant
+from pyrogram.errors import UserAlreadyParticipant, ChatAdminRequired, UserNotParticipant, FloodWait
 from config import API_ID, API_HASH, BOT_TOKEN, NEW_REQ_MODE, SESSION_STRING
 
 @Client.on_message(filters.command('accept'))
@@ -2,12 +2,19 @@ import os
 import random
 import logging
 import time
+import uuid
 import asyncio
 import pyrogram
+from contextlib import asynccontextmanager
 from pyrogram import Client, filters, enums
 from pyrogram.errors import FloodWait, UserIsBlocked, InputUserDeactivated, UserAlreadyParticipant, InviteHashExpired, UsernameNotOccupied
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, Message, CallbackQuery
 from config import *
+from plugins.helper.db import db
+from plugins.helper.log_queue import log_queue
+from plugins.helper.user_session import user_sessions, CONNECTION_ERRORS
+from plugins.helper.progress import Progress
+from plugins.helper.parallel_download import download, download_dir, remove_download
 
 start_time = time.time()
 logging.basicConfig(level=logging.DEBUG)
@@ -18,102 +25,6 @@ logger = logging.getLogger(__name__)
 class batch_temp(object):
     IS_BATCH = {}
 
-async def downstatus(client, statusfile, message, chat):
-    while True:
-        if os.path.exists(statusfile):
-            break
-        await asyncio.sleep(1)
-
-    while os.path.exists(statusfile):
-        with open(statusfile, "r") as downread:
-            txt = downread.read()
-        try:
-            await client.edit_message_text(chat, message.id, f"> **Downloading 📥** \n\n**{txt}**")
-            await asyncio.sleep(2)
-        except:
-            await asyncio.sleep(2)
-
-async def upstatus(client, statusfile, message, chat):
-    while True:
-        if os.path.exists(statusfile):
-            break
-        await asyncio.sleep(1)
-    while os.path.exists(statusfile):
-        with open(statusfile, "r") as upread:
-            txt = upread.read()
-        try:
-            await client.edit_message_text(chat, message.id, f"> **Uploading 📤** \n\n**{txt}**")
-            await asyncio.sleep(2)
-        except:
-            await asyncio.sleep(2)
-
-async def progress(current, total, message, type):
-    try:
-        # Initialize or reset the start time for each task
-        if not hasattr(progress, "start_time") or progress.task_type != type:
-            progress.start_time = time.time()
-            progress.task_type = type  # Keep track of the current task type
-
-        # Calculate elapsed time
-        elapsed_time = time.time() - progress.start_time  # Elapsed time in seconds
-
-        # Calculate percentage progress
-        percent = current * 100 / total
-        processed = current / (1024 * 1024)  # Processed in MB
-        total_size = total / (1024 * 1024)  # Total size in MB
-        
-        # Calculate the download/upload speed in MB/s
-        speed = current / elapsed_time / (1024 * 1024) if elapsed_time > 0 else 0
-
-        # Calculate estimated time remaining (ETA)
-        if speed > 0:
-            remaining_bytes = total - current
-            eta_seconds = remaining_bytes / (speed * 1024 * 1024)
-            hours, remainder = divmod(int(eta_seconds), 3600)
-            minutes, seconds = divmod(remainder, 60)
-            eta_formatted = f"{hours}h {minutes}m {seconds}s" if hours else f"{minutes}m {seconds}s"
-        else:
-            eta_formatted = "Calculating..."
-
-        # Format the elapsed time in a readable format (hours, minutes, seconds)
-        hours, remainder = divmod(int(elapsed_time), 3600)
-        minutes, seconds = divmod(remainder, 60)
-        elapsed_formatted = f"{hours}h {minutes}m {seconds}s" if hours else f"{minutes}m {seconds}s"
-
-        # Create a progress bar
-        progress_bar_length = 10  # Length of the progress bar
-        filled_length = int(progress_bar_length * percent / 100)
-        progress_bar = "▰" * filled_length + "▱" * (progress_bar_length - filled_length)
-
-        # Update progress message in file
-        with open(f'{message.id}{type}status.txt', "w") as fileup:
-            fileup.write(
-                f"**{progress_bar}**\n"
-                f"**📈 Progress**: {percent:.1f}%\n"
-                f"**📦 Processed**: {processed:.2f}MB / {total_size:.2f}MB\n"
-                f"**⚡ Speed**: {speed:.2f} MB/s\n"
-                f"**⏱️ Elapsed Time**: {elapsed_formatted}\n"
-                f"**⏳ ETA**: {eta_formatted}"
-            )
-
-        # Update the message with the progress
-        if percent % 5 == 0:  # Update every 5% for smoother experience
-            try:
-                await message.edit_text(
-                    f"**🚀 {type.capitalize()} Progress**\n\n"
-                    f"**[{progress_bar}]**\n"
-                    f"**📈 Progress**: {percent:.1f}%\n"
-                    f"**📦 Processed**: {processed:.2f}MB / {total_size:.2f}MB\n"
-                    f"**⚡ Speed**: {speed:.2f} MB/s\n"
-                    f"**⏱️ Elapsed Time**: {elapsed_formatted}\n"
-                    f"**⏳ ETA**: {eta_formatted}"
-                )
-            except Exception as e:
-                # In case of any errors, log them
-                logger.error(f"Error updating message: {e}")
-        
-    except Exception as e:
-        logger.error(f"Error in progress function: {e}")
 #————————————————————————————————————————————————————————————————————————————————————————————
 
 @Client.on_message(filters.command(["cancel"]))
@@ -141,41 +52,46 @@ async def save(client: Client, message: Message):
 
         batch_temp.IS_BATCH[message.from_user.id] = False
 
-        # Connect using the session string
-        acc = Client("manual_session", session_string=SESSION_STRING, api_hash=API_HASH, api_id=API_ID)
-        await acc.connect()
-
         try:
-            for msgid in range(fromID, toID + 1):
-                if batch_temp.IS_BATCH.get(message.from_user.id):
-                    break
-
-                # Handle private chats
-                if "https://t.me/c/" in message.text:
-                    chatid = int("-100" + datas[4])
-                    source_link = f"https://t.me/c/{datas[4]}/{msgid}"
-                    
-                    try:
-                        await handle_private(client, acc, message, chatid, msgid)
-
-                        # Log message with source link
-                        log_text = f"📩 **New Message saved** ☝🏻☝🏻\n\n**☃️ Nᴀᴍᴇ: {message.from_user.mention}**\n👤 **User ID:** `{message.from_user.id}`\n🔗 **Source:** [Click Here]({source_link})"
-                        await client.send_message(LOG_CHANNEL, log_text, disable_web_page_preview=True)
-
-                    except Exception as e:
-                        if ERROR_MESSAGE:
-                            await client.send_message(message.chat.id, f"Error: {e}", reply_to_message_id=message.id)
-
-                # Handle public chats
-                else:
-                    username = datas[3]
-                    source_link = f"https://t.me/{username}/{msgid}"
-
-                    try:
-                        msg = await client.get_messages(username, msgid)
-                    except UsernameNotOccupied:
-                        await client.send_message(message.chat.id, "The username is not occupied by anyone", reply_to_message_id=message.id)
-                        return
+            # Handle private chats
+            if "https://t.me/c/" in message.text:
+                # Shared user session, connected once at startup; public links only need the bot
+                try:
+                    acc = await user_sessions.get()
+                except Exception as e:
+                    return await message.reply_text(f"**User session unavailable: {e}**")
+
+                chatid = int("-100" + datas[4])
+                try:
+                    messages = await get_messages_range(acc, message, chatid, fromID, toID)
+                except Exception as e:
+                    if isinstance(e, CONNECTION_ERRORS):
+                        await user_sessions.recover(acc)
+                    if ERROR_MESSAGE:
+                        await client.send_message(message.chat.id, f"Error: {e}", reply_to_message_id=message.id)
+                    return
+                await report_total(client, message, messages, fromID, toID)
+                await SavePipeline(client, acc, message, datas[4]).run(messages)
+
+            # Handle public chats
+            else:
+                username = datas[3]
+                try:
+                    messages = await get_messages_range(client, message, username, fromID, toID)
+                except UsernameNotOccupied:
+                    await client.send_message(message.chat.id, "The username is not occupied by anyone", reply_to_message_id=message.id)
+                    return
+                except Exception as e:
+                    if ERROR_MESSAGE:
+                        await client.send_message(message.chat.id, f"Error: {e}", reply_to_message_id=message.id)
+                    return
+                await report_total(client, message, messages, fromID, toID)
+
+                for msg in messages:
+                    if batch_temp.IS_BATCH.get(message.from_user.id):
+                        break
+
+                    source_link = f"https://t.me/{username}/{msg.id}"
 
                     try:
                         # Copy message to user and log channel
@@ -183,105 +99,216 @@ async def save(client: Client, message: Message):
                         await client.copy_message(LOG_CHANNEL, msg.chat.id, msg.id)
 
                         # Log message with source link
-                        log_text = f"📩 **New Message saved** ☝🏻☝🏻\n\n**☃️ Nᴀᴍᴇ: {message.from_user.mention}**\n👤 **User ID:** `{message.from_user.id}`\n🔗 **Source: [Click Here]({source_link})**"
-                        await client.send_message(LOG_CHANNEL, log_text, disable_web_page_preview=True)
+                        log_text = f"📩 **New Message saved**\n\n**☃️ Nᴀᴍᴇ: {message.from_user.mention}**\n👤 **User ID:** `{message.from_user.id}`\n🔗 **Source: [Click Here]({source_link})**"
+                        log_queue.put(log_text)
 
                     except Exception as e:
                         if ERROR_MESSAGE:
                             await client.send_message(message.chat.id, f"Error: {e}", reply_to_message_id=message.id)
 
-                await asyncio.sleep(0.3)
-
         finally:
             batch_temp.IS_BATCH[message.from_user.id] = True
-            await acc.disconnect()
+
+GET_MESSAGES_LIMIT = 200  # Message ids per get_messages call
+
+async def get_messages_range(client: Client, message: Message, chat_id, from_id: int, to_id: int):
+    """Messages from_id..to_id fetched in chunks, leaving out deleted and service messages"""
+    messages = []
+    for start in range(from_id, to_id + 1, GET_MESSAGES_LIMIT):
+        if batch_temp.IS_BATCH.get(message.from_user.id):
+            break
+        ids = list(range(start, min(start + GET_MESSAGES_LIMIT, to_id + 1)))
+        chunk = await client.get_messages(chat_id, ids)
+        messages += [msg for msg in chunk if not msg.empty and not msg.service]
+    return messages
+
+async def report_total(client: Client, message: Message, messages, from_id: int, to_id: int):
+    if to_id > from_id:
+        await client.send_message(
+            message.chat.id,
+            f"**📦 Saving {len(messages)} messages** (out of {to_id - from_id + 1} ids)",
+            reply_to_message_id=message.id
+        )
 
 # handle private
 
-async def handle_private(client: Client, acc, message: Message, chatid: int, msgid: int):
-    msg: Message = await acc.get_messages(chatid, msgid)
-    if msg.empty: 
-        return 
-    msg_type = get_message_type(msg)
-    if not msg_type: 
-        return 
-    chat = message.chat.id
-    user_id = message.from_user.id  # User's DM ID
+class DiskBudget:
+    """Bytes of restricted downloads allowed on disk at once, shared by every batch"""
 
-    if batch_temp.IS_BATCH.get(user_id): 
-        return 
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self._changed = asyncio.Condition()
 
-    if msg_type == "Text":
+    @asynccontextmanager
+    async def reserve(self, size):
+        async with self._changed:
+            # A file bigger than the whole budget still goes through, alone
+            await self._changed.wait_for(lambda: self.used == 0 or self.used + size <= self.limit)
+            self.used += size
         try:
-            text_msg = await client.send_message(user_id, msg.text, entities=msg.entities, parse_mode=enums.ParseMode.HTML)
-            await client.send_message(LOG_CHANNEL, msg.text, entities=msg.entities, parse_mode=enums.ParseMode.HTML)
-            return 
-        except Exception as e:
-            await client.send_message(chat, f"Error: {e}", reply_to_message_id=message.id)
-            return 
+            yield
+        finally:
+            async with self._changed:
+                self.used -= size
+                self._changed.notify_all()
+
+disk = DiskBudget(RESTRICTED_DISK_LIMIT_MB * 1024 * 1024)
+
+
+class SavePipeline:
+    """
+    Saves messages of a private chat with downloads and uploads overlapping.
+    Up to RESTRICTED_DOWNLOADS files download while up to RESTRICTED_UPLOADS upload to the
+    log channel, within the shared disk budget. Each finished message is then copied from
+    the log channel to the user, in message order.
+    """
+
+    def __init__(self, client: Client, acc, message: Message, source: str):
+        self.client = client
+        self.acc = acc
+        self.message = message
+        self.source = source
+        self.chat = message.chat.id
+        self.user_id = message.from_user.id  # User's DM ID
+        self.task = uuid.uuid4().hex  # Keeps this save's downloads apart from other users saving the same post
+        self.downloads = asyncio.Semaphore(RESTRICTED_DOWNLOADS)
+        self.uploads = asyncio.Semaphore(RESTRICTED_UPLOADS)
+
+    def cancelled(self):
+        return batch_temp.IS_BATCH.get(self.user_id)
+
+    async def run(self, messages):
+        # Bounded look-ahead: tasks are awaited in the order they were queued
+        window = asyncio.Queue(maxsize=RESTRICTED_DOWNLOADS + RESTRICTED_UPLOADS)
+
+        async def produce():
+            for msg in messages:
+                if self.cancelled():
+                    break
+                await window.put((msg.id, asyncio.create_task(self.prepare(msg))))
+            await window.put(None)
 
-    smsg = await client.send_message(chat, '**Downloading**', reply_to_message_id=message.id)
-    asyncio.create_task(downstatus(client, f'{message.id}downstatus.txt', smsg, chat))
+        producer = asyncio.create_task(produce())
+        try:
+            while (item := await window.get()) is not None:
+                msgid, task = item
+                try:
+                    result = await task
+                    if result:
+                        await self.deliver(msgid, *result)
+                except Exception as e:
+                    if isinstance(e, CONNECTION_ERRORS):
+                        await user_sessions.recover(self.acc)
+                    if ERROR_MESSAGE:
+                        await self.client.send_message(self.chat, f"Error: {e}", reply_to_message_id=self.message.id)
+        finally:
+            producer.cancel()
+            while not window.empty():
+                item = window.get_nowait()
+                if item:
+                    item[1].cancel()
+
+    async def prepare(self, msg: Message):
+        """Get one message ready for delivery. Returns (msg, msg_type, prepared) or None to skip it."""
+        msg_type = get_message_type(msg)
+        if not msg_type or self.cancelled():
+            return None
+        if msg_type == "Text":
+            return msg, msg_type, None
+
+        # Media saved before is sent again by file_id, without any transfer
+        cached = await db.get_cached_media(getattr(msg, msg_type.lower()).file_unique_id)
+        if cached:
+            return msg, msg_type, cached["file_id"]
+
+        log_msg = await self.transfer(msg, msg_type)
+        return (msg, msg_type, log_msg) if log_msg else None
+
+    async def transfer(self, msg: Message, msg_type: str):
+        """Download the media and upload it once, to the log channel. Returns the log channel message."""
+        media = getattr(msg, msg_type.lower())
+        file = thumb = smsg = progress = None
+        async with disk.reserve(media.file_size or 0):
+            try:
+                async with self.downloads:
+                    smsg = await self.client.send_message(self.chat, '**Downloading**', reply_to_message_id=self.message.id)
+                    progress = Progress(self.client, smsg, "Downloading 📥")
+                    file = await download(self.acc, msg, media, self.task, progress.update)
+                    if msg_type in ("Document", "Video", "Audio") and media.thumbs:
+                        thumb = await self.acc.download_media(media.thumbs[0].file_id, file_name=download_dir(msg, self.task))
+
+                if self.cancelled():
+                    return None
+
+                async with self.uploads:
+                    progress.reset("Uploading 📤")
+                    send_func, kwargs = upload_args(self.client, msg, msg_type, file, thumb)
+                    log_msg = await send_func(LOG_CHANNEL, progress=progress.update, **kwargs)
+            finally:
+                if progress:
+                    progress.finish()
+                remove_download(thumb)
+                remove_download(file)
+                if smsg:
+                    try:
+                        await smsg.delete()
+                    except Exception:
+                        pass
+
+        # Remember the bot-side file so repeat requests skip the transfer
+        await db.cache_media(media.file_unique_id, {
+            "file_id": getattr(log_msg, msg_type.lower()).file_id,
+            "type": msg_type,
+            "source_chat_id": msg.chat.id,
+            "source_message_id": msg.id,
+            "log_message_id": log_msg.id
+        })
+        return log_msg
+
+    async def deliver(self, msgid, msg: Message, msg_type: str, prepared):
+        if msg_type == "Text":
+            await self.client.send_message(self.user_id, msg.text, entities=msg.entities, parse_mode=enums.ParseMode.HTML)
+            await self.client.send_message(LOG_CHANNEL, msg.text, entities=msg.entities, parse_mode=enums.ParseMode.HTML)
+
+        elif isinstance(prepared, str):
+            try:
+                sent_msg = await self.client.send_cached_media(self.user_id, prepared, caption=msg.caption, parse_mode=enums.ParseMode.HTML)
+            except Exception as e:
+                logger.warning(f"Cached media for {msgid} unusable, downloading again: {e}")
+                await db.drop_cached_media(getattr(msg, msg_type.lower()).file_unique_id)
+                log_msg = await self.transfer(msg, msg_type)
+                if not log_msg:
+                    return
+                await log_msg.copy(self.user_id)
+            else:
+                await sent_msg.copy(LOG_CHANNEL)
 
-    try:
-        file = await acc.download_media(msg, progress=progress, progress_args=[message, "down"])
-        os.remove(f'{message.id}downstatus.txt')
-    except Exception as e:
-        await client.send_message(chat, f"Error: {e}", reply_to_message_id=message.id)
-        return await smsg.delete()
+        else:
+            await prepared.copy(self.user_id)
 
-    if batch_temp.IS_BATCH.get(user_id): 
-        return 
+        # Log message with source link
+        source_link = f"https://t.me/c/{self.source}/{msgid}"
+        log_text = f"📩 **New Message saved**\n\n**☃️ Nᴀᴍᴇ: {self.message.from_user.mention}**\n👤 **User ID:** `{self.user_id}`\n🔗 **Source:** [Click Here]({source_link})"
+        log_queue.put(log_text)
 
-    asyncio.create_task(upstatus(client, f'{message.id}upstatus.txt', smsg, chat))
 
+def upload_args(client: Client, msg: Message, msg_type: str, file, thumb):
+    """The bot send method and arguments that upload a downloaded file as `msg_type`"""
     caption = msg.caption if msg.caption else None
-
-    # Sending to both DM and log channel separately
-    async def send_to_user_and_log(send_func, **kwargs):
-        try:
-            # Send to user's DM
-            sent_msg = await send_func(user_id, **kwargs)
-
-            # Send to log channel separately (new message)
-            await send_func(LOG_CHANNEL, **kwargs)
-        except Exception as e:
-            await client.send_message(chat, f"Error: {e}", reply_to_message_id=message.id)
-
     if msg_type == "Document":
-        thumb = await acc.download_media(msg.document.thumbs[0].file_id) if msg.document.thumbs else None
-        await send_to_user_and_log(client.send_document, document=file, thumb=thumb, caption=caption, parse_mode=enums.ParseMode.HTML)
-        if thumb:
-            os.remove(thumb)
-
-    elif msg_type == "Video":
-        thumb = await acc.download_media(msg.video.thumbs[0].file_id) if msg.video.thumbs else None
-        await send_to_user_and_log(client.send_video, video=file, duration=msg.video.duration, width=msg.video.width, height=msg.video.height, thumb=thumb, caption=caption, parse_mode=enums.ParseMode.HTML)
-        if thumb:
-            os.remove(thumb)
-
-    elif msg_type == "Animation":
-        await send_to_user_and_log(client.send_animation, animation=file, caption=caption, parse_mode=enums.ParseMode.HTML)
-
-    elif msg_type == "Sticker":
-        await send_to_user_and_log(client.send_sticker, sticker=file)
-
-    elif msg_type == "Voice":
-        await send_to_user_and_log(client.send_voice, voice=file, caption=caption, parse_mode=enums.ParseMode.HTML)
-
-    elif msg_type == "Audio":
-        thumb = await acc.download_media(msg.audio.thumbs[0].file_id) if msg.audio.thumbs else None
-        await send_to_user_and_log(client.send_audio, audio=file, thumb=thumb, caption=caption, parse_mode=enums.ParseMode.HTML)
-        if thumb:
-            os.remove(thumb)
-
-    elif msg_type == "Photo":
-        await send_to_user_and_log(client.send_photo, photo=file, caption=caption, parse_mode=enums.ParseMode.HTML)
-
-    if os.path.exists(f'{message.id}upstatus.txt'): 
-        os.remove(f'{message.id}upstatus.txt')
-    os.remove(file)
-    await smsg.delete()
+        return client.send_document, dict(document=file, thumb=thumb, caption=caption, parse_mode=enums.ParseMode.HTML)
+    if msg_type == "Video":
+        return client.send_video, dict(video=file, duration=msg.video.duration, width=msg.video.width, height=msg.video.height, thumb=thumb, caption=caption, parse_mode=enums.ParseMode.HTML)
+    if msg_type == "Animation":
+        return client.send_animation, dict(animation=file, caption=caption, parse_mode=enums.ParseMode.HTML)
+    if msg_type == "Sticker":
+        return client.send_sticker, dict(sticker=file)
+    if msg_type == "Voice":
+        return client.send_voice, dict(voice=file, caption=caption, parse_mode=enums.ParseMode.HTML)
+    if msg_type == "Audio":
+        return client.send_audio, dict(audio=file, thumb=thumb, caption=caption, parse_mode=enums.ParseMode.HTML)
+    return client.send_photo, dict(photo=file, caption=caption, parse_mode=enums.ParseMode.HTML)
 
 
 # get the type of message
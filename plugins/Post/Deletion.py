@@ -1,8 +1,11 @@
+import random
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from plugins.helper.db import db  # Database helper
-from config import ADMIN
+from config import ADMIN, REACTIONS
 from plugins.Post.admin_panel import admin_filter
+from plugins.helper.batch_delete import delete_in_batches
+from plugins.helper.scheduler import scheduler
 
 @Client.on_message(filters.command("del_post") & filters.private & admin_filter)
 async def delete_post_manually(client, message: Message):
@@ -34,23 +37,27 @@ async def delete_post_manually(client, message: Message):
     failed_count = 0
     failed_channels = []
     
+    deleted_channels = []
+    outcome = await delete_in_batches(client, [(c["channel_id"], c["message_id"]) for c in channels])
+    
     for channel in channels:
-        try:
-            await client.delete_messages(
-                chat_id=channel["channel_id"],
-                message_ids=channel["message_id"]
-            )
+        error = outcome.get((channel["channel_id"], channel["message_id"]))
+        if error is None:
             success_count += 1
-            # Remove from database after successful deletion
-            await db.remove_channel_post(post_id, channel["channel_id"])
-        except Exception as e:
+            deleted_channels.append(channel["channel_id"])
+        else:
             failed_count += 1
-            failed_channels.append(f"{channel.get('channel_name', channel['channel_id'])}: {str(e)}")
+            failed_channels.append(f"{channel.get('channel_name', channel['channel_id'])}: {error}")
+    
+    # Remove from database after successful deletion
+    if deleted_channels:
+        await db.remove_channel_posts(post_id, deleted_channels)
     
     # Check if all channels were deleted
     remaining_channels = await db.get_post_channels(post_id)
     if not remaining_channels:
         await db.delete_post(post_id)
+        scheduler.cancel("post", post_id)
     
     result_msg = (
         f"🗑 <b>Post Deletion Results</b>\n\n"
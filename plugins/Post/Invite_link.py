@@ -8,51 +8,114 @@ import random
 import asyncio
 from config import *
 from plugins.Post.admin_panel import admin_filter
+from plugins.helper.fanout import run_concurrently
+from plugins.helper.rate_limiter import POSTING, SYSTEM
+from plugins.helper.scheduler import scheduler
+from plugins.helper.time_parser import format_time
+
+INVITE_REVOKE = "invite_revoke"
 
 @Client.on_message(filters.command("genlink") & filters.private & admin_filter)
 async def generate_invite_links(client, message: Message):
-    # Parse time argument
+    # Parse time argument and the force-refresh flag
+    args = [arg.lower() for arg in message.command[1:]]
+    force = any(arg in ("-f", "force", "refresh") for arg in args)
     expire_time = None
-    time_suffix = ""
-    if len(message.command) > 1:
-        time_arg = message.command[1].lower()
+    expiry_class = "permanent"
+    for time_arg in args:
         if match := re.match(r"^(\d+)([mhd])$", time_arg):
             num, unit = match.groups()
             num = int(num)
             if unit == 'm':
                 expire_time = timedelta(minutes=num)
-                time_suffix = f"⏳ Expires in {num} minutes"
             elif unit == 'h':
                 expire_time = timedelta(hours=num)
-                time_suffix = f"⏳ Expires in {num} hours"
             elif unit == 'd':
                 expire_time = timedelta(days=num)
-                time_suffix = f"⏳ Expires in {num} days"
+            expiry_class = time_arg
+            break
 
     # Initial processing message
     processing_msg = await message.reply("🔄 <b>Generating fresh links...</b>")
 
-    # Generate links
+    # Reuse cached links of the same expiry class that still have enough lifetime left
+    channels = await db.get_all_channels()
+    now = time.time()
+    min_remaining = expire_time.total_seconds() * INVITE_REUSE_RATIO if expire_time else 0
     links = {}
-    success_count = 0
-    for channel in await db.get_all_channels():
-        try:
-            invite = await client.create_chat_invite_link(
-                chat_id=channel['_id'],
-                name=f"Link_{datetime.now().strftime('%m%d%H%M')}",
-                expire_date=datetime.now() + expire_time if expire_time else None
-            )
-            links[channel['_id']] = {
-                'link': invite.invite_link,
-                'name': channel['name']
-            }
-            success_count += 1
-        except Exception as e:
-            print(f"Error in {channel['name']}: {str(e)}")
+    to_create = []
+    rotated = []
+    for channel in channels:
+        cached = channel.get("invite_links", {}).get(expiry_class)
+        valid = cached and (cached["expire_at"] is None or cached["expire_at"] - now >= min_remaining)
+        if valid and not force:
+            links[channel['_id']] = {'link': cached['link'], 'name': channel['name'], 'expire_at': cached['expire_at']}
+        else:
+            to_create.append(channel)
+            if valid:
+                rotated.append({"channel_id": channel['_id'], "name": channel['name'], "expiry_class": expiry_class, "link": cached['link']})
+    reused_count = len(links)
+
+    # Generate the missing links concurrently
+    link_name = f"Link_{datetime.now().strftime('%m%d%H%M')}"
+    expire_date = datetime.now() + expire_time if expire_time else None
+    expire_at = now + expire_time.total_seconds() if expire_time else None
+
+    async def create_link(channel):
+        return await client.create_chat_invite_link(
+            chat_id=channel['_id'],
+            name=link_name,
+            expire_date=expire_date
+        )
+
+    created = {}
+    for channel, (ok, result) in zip(to_create, await run_concurrently(to_create, create_link, lane_name=POSTING)):
+        if ok:
+            links[channel['_id']] = {'link': result.invite_link, 'name': channel['name'], 'expire_at': expire_at}
+            created[channel['_id']] = {'link': result.invite_link, 'expire_at': expire_at}
+        else:
+            print(f"Error in {channel['name']}: {str(result)}")
+    await db.cache_invite_links(expiry_class, created)
+    success_count = len(links)
+
+    # Store the link set so revocation survives restarts
+    set_id = int(time.time() * 1000)
+    link_set = {
+        "_id": set_id,
+        "links": [{"channel_id": chat_id, "expiry_class": expiry_class, **info} for chat_id, info in links.items()],
+        "expire_at": max(info['expire_at'] for info in links.values()) if expire_time and links else None,
+        "status": "active",
+        "created_at": time.time()
+    }
+    if links:
+        await db.save_link_set(link_set)
+        if link_set["expire_at"]:
+            scheduler.schedule(INVITE_REVOKE, set_id, link_set["expire_at"])
+
+    # A forced refresh retires the links it replaced, stored as a set due now so a restart still revokes them
+    if rotated:
+        rotation_id = set_id + 1
+        await db.save_link_set({
+            "_id": rotation_id,
+            "links": rotated,
+            "expire_at": now,
+            "status": "active",
+            "rotation": True,
+            "created_at": time.time()
+        })
+        scheduler.schedule(INVITE_REVOKE, rotation_id, now)
+
+    # Reused links expire sooner than requested, so show their real remaining time
+    time_suffix = ""
+    if expire_time and links:
+        remaining = sorted({info['expire_at'] for info in links.values()})
+        soonest = format_time(int(round((remaining[0] - now) / 60) * 60))
+        latest = format_time(int(round((remaining[-1] - now) / 60) * 60))
+        time_suffix = f"⏳ Expires in {latest}" if soonest == latest else f"⏳ Expires in {soonest} to {latest}"
 
     # Prepare response
     header = (
-        f"✨ <b>Generated Fresh links for {success_count} channels.</b>\n"
+        f"✨ <b>Links for {success_count} channels</b> ({len(created)} new, {reused_count} reused)\n"
         f"**{time_suffix}**\n\n"
     )
     
@@ -67,7 +130,7 @@ async def generate_invite_links(client, message: Message):
     first_chunk = "\n".join(
         f"• <a href='{info['link']}'><b>{info['name']}</b></a>"
         for info in chunks[0]
-    )
+    ) if chunks else ""
     
     footer = (
         "\n\n**⚠️ <i>These links will be revoked if you click 'Revoke Now</i>**"
@@ -77,7 +140,7 @@ async def generate_invite_links(client, message: Message):
     # Create buttons only for the first message
     buttons = []
     if links:
-        buttons.append([InlineKeyboardButton("🔴 Revoke Now", callback_data="revoke_all")])
+        buttons.append([InlineKeyboardButton("🔴 Revoke Now", callback_data=f"revoke_all_{set_id}")])
     
     await processing_msg.delete()
     first_message = await message.reply(
@@ -97,38 +160,76 @@ async def generate_invite_links(client, message: Message):
             disable_web_page_preview=True
         )
 
-    # Store links
-    client.generated_links = links
 
-    # Schedule auto-revocation
-    if expire_time:
-        asyncio.create_task(auto_revoke_links(client, links, expire_time))
+async def revoke_links(client, links):
+    """Revoke links concurrently and drop them from the channel link cache. Returns the revoked count."""
+    async def revoke(link):
+        await client.revoke_chat_invite_link(link["channel_id"], link["link"])
 
-async def auto_revoke_links(client, links, delay):
-    await asyncio.sleep(delay.total_seconds())
-    if hasattr(client, 'generated_links'):
-        for chat_id, info in links.items():
-            try:
-                await client.revoke_chat_invite_link(chat_id, info['link'])
-            except:
-                continue
-        del client.generated_links
+    results = await run_concurrently(links, revoke, lane_name=SYSTEM)
+    for link, (ok, result) in zip(links, results):
+        if not ok:
+            print(f"Error revoking link in {link['name']}: {result}")
+    await db.forget_invite_links(links)
+    return sum(1 for ok, _ in results if ok)
 
-@Client.on_callback_query(filters.regex("^revoke_all$"))
+
+async def revoke_link_sets(client, link_sets, force=False):
+    """
+    Revoke the links of the given sets and mark the sets as revoked.
+    On expiry a reused link is kept while another active set still shows it; the last set to go revokes it.
+    With `force` every link is revoked and dropped from the other sets showing it.
+    Returns (revoked, kept) counts.
+    """
+    set_ids = [link_set["_id"] for link_set in link_sets]
+    links = {link["link"]: link for link_set in link_sets for link in link_set["links"]}
+    shared = set() if force else await db.get_shared_links(links, set_ids)
+    revoked = await revoke_links(client, [link for url, link in links.items() if url not in shared])
+    if force:
+        await db.release_links(links, set_ids)
+
+    for set_id in set_ids:
+        scheduler.cancel(INVITE_REVOKE, set_id)
+    await db.finish_link_sets(set_ids)
+    return revoked, len(shared)
+
+
+async def auto_revoke_links(client, set_ids):
+    """Scheduler handler for link sets whose expiry has passed"""
+    link_sets = [s for s in await db.get_link_sets(set_ids) if s["status"] == "active"]
+    # Links replaced by /genlink -f are retired even where older sets still show them
+    rotations = [s for s in link_sets if s.get("rotation")]
+    expired = [s for s in link_sets if not s.get("rotation")]
+    if rotations:
+        await revoke_link_sets(client, rotations, force=True)
+    if expired:
+        await revoke_link_sets(client, expired)
+
+scheduler.register(INVITE_REVOKE, auto_revoke_links)
+
+
+async def restore_invite_revocations():
+    """Re-schedule expiring link sets after a restart. Overdue ones are revoked as soon as the scheduler starts."""
+    for link_set in await db.get_active_link_sets():
+        if link_set.get("expire_at"):
+            scheduler.schedule(INVITE_REVOKE, link_set["_id"], link_set["expire_at"])
+
+
+@Client.on_callback_query(filters.regex(r"^revoke_all(_\d+)?$"))
 async def revoke_all_links(client, callback_query: CallbackQuery):
-    if not hasattr(client, 'generated_links'):
+    # Older messages carry a bare "revoke_all" button, which revokes every active set
+    set_id = callback_query.data[len("revoke_all_"):]
+    if set_id:
+        link_sets = [s for s in await db.get_link_sets([int(set_id)]) if s["status"] == "active"]
+    else:
+        link_sets = await db.get_active_link_sets()
+
+    if not link_sets:
         await callback_query.answer("❌ No active links found!", show_alert=True)
         return
 
     await callback_query.answer("⏳ Revoking links...")
-    
-    revoked = 0
-    for chat_id, info in client.generated_links.items():
-        try:
-            await client.revoke_chat_invite_link(chat_id, info['link'])
-            revoked += 1
-        except:
-            continue
+    revoked, _ = await revoke_link_sets(client, link_sets, force=True)
 
     # Update original message
     await callback_query.message.edit_text(
@@ -136,5 +237,3 @@ async def revoke_all_links(client, callback_query: CallbackQuery):
         f"**All previous links are now invalid**",
         reply_markup=None
     )
-    
-    del client.generated_links
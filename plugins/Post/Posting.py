@@ -7,56 +7,209 @@ from plugins.helper.time_parser import *
 import asyncio
 from config import *
 from plugins.Post.admin_panel import admin_filter
+from plugins.helper.fanout import fan_out
+from plugins.helper.rate_limiter import lane, POSTING
+from plugins.helper.retry_queue import RetryQueue
+from plugins.helper.scheduler import scheduler
+from plugins.helper.batch_delete import delete_in_batches
+from plugins.helper.log_queue import log_queue
+
+retry_queue = RetryQueue()
 
 async def restore_pending_deletions(client):
     """Restore pending deletions when bot starts"""
     try:
-        pending_posts = await db.get_pending_deletions()
         now = time.time()
-        
-        for post in pending_posts:
-            post_id = post["post_id"]
-            delete_after = post["delete_after"] - now
-            
-            if delete_after > 0:  # Only if deletion is in future
-                channels = post.get("channels", [])
-                deletion_tasks = []
-                
-                for channel in channels:
-                    deletion_tasks.append(
-                        schedule_deletion(
-                            client,
-                            channel["channel_id"],
-                            channel["message_id"],
-                            delete_after,
-                            post["user_id"],
-                            post_id,
-                            channel.get("channel_name", str(channel["channel_id"])),
-                            post.get("confirmation_msg_id")
-                        )
-                    )
-                
-                if deletion_tasks:
-                    asyncio.create_task(
-                        handle_deletion_results(
-                            client=client,
-                            deletion_tasks=deletion_tasks,
-                            post_id=post_id,
-                            delay_seconds=delete_after
-                        )
-                    )
+        overdue = 0
+        async for post in db.iter_pending_deletions():
+            deadline = post["delete_after"]
+            if deadline <= now:
+                # Missed while offline: spread over catch-up steps instead of one burst
+                deadline = now + (overdue // CATCHUP_BATCH) * CATCHUP_INTERVAL
+                overdue += 1
+            scheduler.schedule("post", post["post_id"], deadline)
+        if overdue:
+            print(f"Catching up on {overdue} overdue post deletion(s)")
     except Exception as e:
         print(f"Error restoring pending deletions: {e}")
 
+def build_send_func(client, source_chat_id, source_message_id, is_forward=False):
+    """Return the per-channel send used by the fan-out, retries and resumed jobs"""
+    if is_forward:
+        return lambda channel: client.forward_messages(
+            chat_id=channel["_id"],
+            from_chat_id=source_chat_id,
+            message_ids=source_message_id
+        )
+    return lambda channel: client.copy_message(
+        chat_id=channel["_id"],
+        from_chat_id=source_chat_id,
+        message_id=source_message_id
+    )
+
+def record_delivery(post_id):
+    """Fan-out hook that writes every channel result to the post as soon as it lands"""
+    async def on_result(ok, data):
+        if ok:
+            await db.add_channel_post(post_id, data)
+        else:
+            await db.add_failed_channel(post_id, data)
+    return on_result
+
+async def resume_unfinished_posts(client):
+    """Finish posts whose fan-out was interrupted by a restart"""
+    try:
+        for post in await db.get_unfinished_posts():
+            try:
+                await resume_post(client, post)
+            except Exception as e:
+                print(f"Error resuming post {post.get('post_id')}: {e}")
+    except Exception as e:
+        print(f"Error resuming unfinished posts: {e}")
+
+async def resume_post(client, post):
+    post_id = post["post_id"]
+    delivered = post.get("channels", [])
+    failed = post.get("failed_channels", [])
+    done = {channel["channel_id"] for channel in delivered + failed}
+    targets = post.get("targets", [])
+    remaining = [channel for channel in targets if channel["_id"] not in done]
+
+    # Past its auto-delete deadline the post must not reach any more channels
+    delete_at = post.get("delete_after")
+    if delete_at and delete_at <= time.time():
+        remaining = []
+
+    send_func = build_send_func(client, post["source_chat_id"], post["source_message_id"], post.get("is_forward", False))
+    sent_messages, failed_channels = await fan_out(
+        remaining, send_func, label="resuming", on_result=record_delivery(post_id)
+    )
+    await db.finish_post(post_id)
+
+    if delete_at and sent_messages:
+        # Re-arm so channels delivered after the restored deadline fired are deleted too
+        scheduler.schedule("post", post_id, delete_at)
+
+    report = {
+        "title": "Posting Resumed!",
+        "post_id": post_id,
+        "user_id": post["user_id"],
+        "success_count": len(delivered) + len(sent_messages),
+        "total_channels": len(targets),
+        "delete_after": int(delete_at - post["created_at"]) if delete_at else None,
+        "delete_at": delete_at,
+        "failed_channels": failed + failed_channels,
+        "confirmation_msg_id": post["confirmation_msg_id"],
+        "reply_markup": InlineKeyboardMarkup([
+            [InlineKeyboardButton("🗑 Delete This Post", callback_data=f"delete_{post_id}")]
+        ])
+    }
+
+    try:
+        await client.edit_message_text(
+            post["user_id"],
+            post["confirmation_msg_id"],
+            render_post_result(report),
+            reply_markup=report["reply_markup"]
+        )
+    except Exception as e:
+        print(f"Error updating resumed post confirmation: {e}")
+
+    queue_failed_channels(client, report, send_func)
+    print(f"Resumed post {post_id}: {len(sent_messages)} more channel(s) delivered")
+
+def render_post_result(report):
+    """Build the confirmation text for a post from its live report"""
+    result_msg = (
+        f"<blockquote>📣 <b>{report['title']}</b></blockquote>\n\n"
+        f"• <b>Post ID:</b> <code>{report['post_id']}</code>\n"
+        f"• <b>Success:</b> {report['success_count']}/{report['total_channels']} channels\n"
+    )
+    
+    if report["delete_after"]:
+        result_msg += f"• <b>Auto-delete in:</b> {format_time(report['delete_after'])}\n"
+
+    failed_channels = report["failed_channels"]
+    if failed_channels:
+        retrying = sum(1 for channel in failed_channels if channel.get("retrying"))
+        result_msg += f"• <b>Failed:</b> {len(failed_channels)} channels"
+        if retrying:
+            result_msg += f" ({retrying} retrying ⏳)"
+        result_msg += "\n\n"
+        if len(failed_channels) <= 10:
+            result_msg += "<b>Failed Channels:</b>\n"
+            for idx, channel in enumerate(failed_channels, 1):
+                status = " ⏳" if channel.get("retrying") else ""
+                result_msg += f"{idx}. {channel['channel_name']} - {channel['error']}{status}\n"
+        else:
+            result_msg += "<i>Too many failed channels to display (see logs for details)</i>\n"
+
+    return result_msg
+
+async def refresh_post_result(client, report):
+    """Re-render the confirmation message, coalescing updates that land close together"""
+    if report.get("refreshing"):
+        return
+    report["refreshing"] = True
+    await asyncio.sleep(3)
+    report["refreshing"] = False
+    try:
+        await client.edit_message_text(
+            report["user_id"],
+            report["confirmation_msg_id"],
+            render_post_result(report),
+            reply_markup=report["reply_markup"]
+        )
+    except Exception as e:
+        print(f"Error updating post confirmation: {e}")
+
+def queue_failed_channels(client, report, send_func):
+    """Hand channels that failed with a retryable error to the background retry queue"""
+    for failed in report["failed_channels"]:
+        if failed.get("retry_after") is None:
+            continue
+        failed["retrying"] = True
+        channel = {"_id": failed["channel_id"], "name": failed["channel_name"]}
+
+        async def run(channel=channel):
+            with lane(POSTING):
+                return await send_func(channel)
+
+        async def on_success(sent_message, failed=failed):
+            sent = {
+                "channel_id": failed["channel_id"],
+                "message_id": sent_message.id,
+                "channel_name": failed["channel_name"]
+            }
+            await deliver_late(client, report, sent)
+            report["failed_channels"].remove(failed)
+            report["success_count"] += 1
+            await refresh_post_result(client, report)
+
+        async def on_failure(error, failed=failed):
+            failed["retrying"] = False
+            failed["error"] = str(error)[:200]
+            await refresh_post_result(client, report)
+
+        retry_queue.submit(run, on_success, on_failure, delay=max(failed["retry_after"], retry_queue.backoff(1)))
+
+async def deliver_late(client, report, sent):
+    """Record a channel delivered by the retry queue under the post's auto-delete deadline"""
+    delete_at = report.get("delete_at")
+    # Too late for the post's deletion, or the post is already gone: don't leave this copy behind
+    if (delete_at and delete_at <= time.time()) or not await db.add_channel_post(report["post_id"], sent):
+        await delete_in_batches(client, [(sent["channel_id"], sent["message_id"])])
+        return
+    if delete_at:
+        # Re-arm in case the deadline fired while this channel was still retrying
+        scheduler.schedule("post", report["post_id"], delete_at)
+
 @Client.on_message(filters.command("post") & filters.private & admin_filter)
 async def send_post(client, message: Message):
     try:
         await message.react(emoji=random.choice(REACTIONS), big=True)
     except:
         pass
-    if not await db.is_admin(message.from_user.id):
-        await message.reply("**❌ You are not authorized to use this command!**")
-        return
     
     if not message.reply_to_message:
         await message.reply("**Reply to a message to post it.**")
@@ -83,63 +236,24 @@ async def send_post(client, message: Message):
         return
 
     post_id = int(time.time())
-    sent_messages = []
-    success_count = 0
     total_channels = len(channels)
-    failed_channels = []
 
     processing_msg = await message.reply(
         f"**📢 Posting to {total_channels} channels...**",
         reply_to_message_id=post_content.id
     )
 
-    deletion_tasks = []
-    
-    for channel in channels:
-        try:
-            sent_message = await client.copy_message(
-                chat_id=channel["_id"],
-                from_chat_id=message.chat.id,
-                message_id=post_content.id
-            )
-
-            sent_messages.append({
-                "channel_id": channel["_id"],
-                "message_id": sent_message.id,
-                "channel_name": channel.get("name", str(channel["_id"]))
-            })
-            success_count += 1
-
-            if delete_after:
-                deletion_tasks.append(
-                    schedule_deletion(
-                        client,
-                        channel["_id"],
-                        sent_message.id,
-                        delete_after,
-                        message.from_user.id,
-                        post_id,
-                        channel.get("name", str(channel["_id"])),
-                        processing_msg.id
-                    )
-                )
-                
-        except Exception as e:
-            error_msg = str(e)[:200]  # Truncate long error messages
-            print(f"Error posting to channel {channel['_id']}: {error_msg}")
-            failed_channels.append({
-                "channel_id": channel["_id"],
-                "channel_name": channel.get("name", str(channel["_id"])),
-                "error": error_msg
-            })
-
-    # Save post with deletion info if needed
+    # Write the job before sending so a restart mid fan-out can resume it
     post_data = {
         "post_id": post_id,
-        "channels": sent_messages,
+        "channels": [],
         "user_id": message.from_user.id,
         "confirmation_msg_id": processing_msg.id,
-        "created_at": time.time()
+        "created_at": time.time(),
+        "status": "sending",
+        "source_chat_id": message.chat.id,
+        "source_message_id": post_content.id,
+        "targets": [{"_id": channel["_id"], "name": channel.get("name")} for channel in channels]
     }
     
     if delete_after:
@@ -147,31 +261,35 @@ async def send_post(client, message: Message):
         post_data["delete_original"] = True
     
     await db.save_post(post_data)
+    post_id = post_data["post_id"]
 
-    result_msg = (
-        f"<blockquote>📣 <b>Posting Completed!</b></blockquote>\n\n"
-        f"• <b>Post ID:</b> <code>{post_id}</code>\n"
-        f"• <b>Success:</b> {success_count}/{total_channels} channels\n"
+    send_func = build_send_func(client, message.chat.id, post_content.id, is_forward=False)
+    sent_messages, failed_channels = await fan_out(
+        channels, send_func, label="posting", on_result=record_delivery(post_id)
     )
-    
-    if delete_after:
-        time_str = format_time(delete_after)
-        result_msg += f"• <b>Auto-delete in:</b> {time_str}\n"
+    await db.finish_post(post_id)
+    success_count = len(sent_messages)
 
-    if failed_channels:
-        result_msg += f"• <b>Failed:</b> {len(failed_channels)} channels\n\n"
-        if len(failed_channels) <= 10:
-            result_msg += "<b>Failed Channels:</b>\n"
-            for idx, channel in enumerate(failed_channels, 1):
-                result_msg += f"{idx}. {channel['channel_name']} - {channel['error']}\n"
-        else:
-            result_msg += "<i>Too many failed channels to display (see logs for details)</i>\n"
+    if delete_after:
+        scheduler.schedule("post", post_id, post_data["delete_after"])
 
-    reply_markup = InlineKeyboardMarkup([
-        [InlineKeyboardButton("🗑 Delete This Post", callback_data=f"delete_{post_id}")]
-    ])
+    time_str = format_time(delete_after) if delete_after else None
+    report = {
+        "title": "Posting Completed!",
+        "post_id": post_id,
+        "user_id": message.from_user.id,
+        "success_count": success_count,
+        "total_channels": total_channels,
+        "delete_after": delete_after,
+        "delete_at": post_data.get("delete_after"),
+        "failed_channels": failed_channels,
+        "confirmation_msg_id": processing_msg.id,
+        "reply_markup": InlineKeyboardMarkup([
+            [InlineKeyboardButton("🗑 Delete This Post", callback_data=f"delete_{post_id}")]
+        ])
+    }
 
-    await processing_msg.edit_text(result_msg, reply_markup=reply_markup)
+    await processing_msg.edit_text(render_post_result(report), reply_markup=report["reply_markup"])
 
     try:
         log_msg = (
@@ -189,80 +307,61 @@ async def send_post(client, message: Message):
             if len(failed_channels) > 15:
                 log_msg += f"  ...and {len(failed_channels)-15} more"
         
-        await client.send_message(
-            chat_id=LOG_CHANNEL,
-            text=log_msg
-        )    
+        log_queue.put(log_msg)
     except Exception as e:
-        print(f"Error sending confirmation to log channel: {e}")
-
-    if delete_after and deletion_tasks:
-        asyncio.create_task(
-            handle_deletion_results(
-                client=client,
-                deletion_tasks=deletion_tasks,
-                post_id=post_id,
-                delay_seconds=delete_after
-            )
-        )
+        print(f"Error queueing confirmation for log channel: {e}")
 
-async def schedule_deletion(client, channel_id, message_id, delay_seconds, user_id, post_id, channel_name, confirmation_msg_id):
-    """Schedule a message for deletion after a delay"""
-    await asyncio.sleep(delay_seconds)
-    
-    try:
-        await client.delete_messages(
-            chat_id=channel_id,
-            message_ids=message_id
-        )
-        
-        await db.remove_channel_post(post_id, channel_id)
-        
-        return {
-            "status": "success",
-            "channel_name": channel_name,
-            "post_id": post_id,
-            "user_id": user_id,
-            "confirmation_msg_id": confirmation_msg_id
-        }
-        
-    except Exception as e:
-        return {
-            "status": "failed",
-            "channel_name": channel_name,
-            "post_id": post_id,
-            "error": str(e),
-            "user_id": user_id,
-            "confirmation_msg_id": confirmation_msg_id
-        }
-
-async def handle_deletion_results(client, deletion_tasks, post_id, delay_seconds):
-    """Handle the results of all deletion tasks"""
+    # Channels that failed on a FloodWait or transient error are retried in the background
+    queue_failed_channels(client, report, send_func)
+
+async def delete_expired_posts(client, post_ids):
+    """Scheduler handler: delete every post that came due, batching messages per channel"""
+    posts = await db.get_posts(post_ids)
+    targets = [
+        (channel["channel_id"], channel["message_id"])
+        for post in posts
+        for channel in post.get("channels", [])
+    ]
+    outcome = await delete_in_batches(client, targets)
+
+    # Deletion is attempted once; failed channels must not come back as overdue on every restart
+    await db.clear_post_deadlines(post_ids)
+
+    for post in posts:
+        try:
+            await finish_post_deletion(client, post, outcome)
+        except Exception as e:
+            print(f"Error auto-deleting post {post['post_id']}: {e}")
+
+async def finish_post_deletion(client, post, outcome):
+    """Record one post's share of a batched deletion and report it"""
+    results = []
+    deleted_channels = []
+    for channel in post.get("channels", []):
+        channel_name = channel.get("channel_name", str(channel["channel_id"]))
+        error = outcome.get((channel["channel_id"], channel["message_id"]), "Not attempted")
+        if error is None:
+            deleted_channels.append(channel["channel_id"])
+            results.append({"status": "success", "channel_name": channel_name})
+        else:
+            results.append({"status": "failed", "channel_name": channel_name, "error": error})
+
+    if deleted_channels:
+        await db.remove_channel_posts(post["post_id"], deleted_channels)
+
+    await handle_deletion_results(client, post, results)
+
+async def handle_deletion_results(client, post, results):
+    """Report the outcome of an auto-deletion to the poster"""
     try:
-        results = await asyncio.gather(*deletion_tasks, return_exceptions=True)
-        
-        success_count = 0
-        failed_count = 0
-        user_id = None
-        confirmation_msg_id = None
-        failed_deletions = []
+        post_id = post["post_id"]
+        user_id = post.get("user_id")
+        confirmation_msg_id = post.get("confirmation_msg_id")
+        success_count = sum(1 for result in results if result["status"] == "success")
+        failed_deletions = [result for result in results if result["status"] != "success"]
+        failed_count = len(failed_deletions)
         
-        for result in results:
-            if isinstance(result, Exception):
-                failed_count += 1
-                continue
-                
-            if user_id is None and result.get("user_id"):
-                user_id = result["user_id"]
-                confirmation_msg_id = result.get("confirmation_msg_id")
-            
-            if result.get("status") == "success":
-                success_count += 1
-            else:
-                failed_count += 1
-                failed_deletions.append(result)
-        
-        if user_id:
+        if user_id and results:
             if success_count > 0 and confirmation_msg_id:
                 try:
                     await client.delete_messages(
@@ -290,14 +389,15 @@ async def handle_deletion_results(client, deletion_tasks, post_id, delay_seconds
             except:
                 pass
 
-        if success_count > 0:
-            remaining_channels = await db.get_post_channels(post_id)
-            if not remaining_channels:
-                await db.delete_post(post_id)
+        remaining_channels = await db.get_post_channels(post_id)
+        if not remaining_channels:
+            await db.delete_post(post_id)
                 
     except Exception as e:
         print(f"Error in handle_deletion_results: {e}")
 
+scheduler.register("post", delete_expired_posts)
+
 @Client.on_message(filters.command("fpost") & filters.private & admin_filter)
 async def forward_post(client, message: Message):
     try:
@@ -330,63 +430,25 @@ async def forward_post(client, message: Message):
         return
 
     post_id = int(time.time())
-    sent_messages = []
-    success_count = 0
     total_channels = len(channels)
-    failed_channels = []
 
     processing_msg = await message.reply(
         f"**📢 Forwarding to {total_channels} channels...**",
         reply_to_message_id=post_content.id
     )
 
-    deletion_tasks = []
-    
-    for channel in channels:
-        try:
-            sent_message = await client.forward_messages(
-                chat_id=channel["_id"],
-                from_chat_id=message.chat.id,
-                message_ids=post_content.id
-            )
-
-            sent_messages.append({
-                "channel_id": channel["_id"],
-                "message_id": sent_message.id,
-                "channel_name": channel.get("name", str(channel["_id"]))
-            })
-            success_count += 1
-
-            if delete_after:
-                deletion_tasks.append(
-                    schedule_deletion(
-                        client,
-                        channel["_id"],
-                        sent_message.id,
-                        delete_after,
-                        message.from_user.id,
-                        post_id,
-                        channel.get("name", str(channel["_id"])),
-                        processing_msg.id
-                    )
-                )
-                
-        except Exception as e:
-            error_msg = str(e)[:200]  # Truncate long error messages
-            print(f"Error forwarding to channel {channel['_id']}: {error_msg}")
-            failed_channels.append({
-                "channel_id": channel["_id"],
-                "channel_name": channel.get("name", str(channel["_id"])),
-                "error": error_msg
-            })
-
+    # Write the job before sending so a restart mid fan-out can resume it
     post_data = {
         "post_id": post_id,
-        "channels": sent_messages,
+        "channels": [],
         "user_id": message.from_user.id,
         "confirmation_msg_id": processing_msg.id,
         "created_at": time.time(),
-        "is_forward": True
+        "is_forward": True,
+        "status": "sending",
+        "source_chat_id": message.chat.id,
+        "source_message_id": post_content.id,
+        "targets": [{"_id": channel["_id"], "name": channel.get("name")} for channel in channels]
     }
     
     if delete_after:
@@ -394,31 +456,35 @@ async def forward_post(client, message: Message):
         post_data["delete_original"] = True
     
     await db.save_post(post_data)
+    post_id = post_data["post_id"]
 
-    result_msg = (
-        f"<blockquote>📣 <b>Forwarding Completed!</b></blockquote>\n\n"
-        f"• <b>Post ID:</b> <code>{post_id}</code>\n"
-        f"• <b>Success:</b> {success_count}/{total_channels} channels\n"
+    send_func = build_send_func(client, message.chat.id, post_content.id, is_forward=True)
+    sent_messages, failed_channels = await fan_out(
+        channels, send_func, label="forwarding", on_result=record_delivery(post_id)
     )
-    
-    if delete_after:
-        time_str = format_time(delete_after)
-        result_msg += f"• <b>Auto-delete in:</b> {time_str}\n"
+    await db.finish_post(post_id)
+    success_count = len(sent_messages)
 
-    if failed_channels:
-        result_msg += f"• <b>Failed:</b> {len(failed_channels)} channels\n\n"
-        if len(failed_channels) <= 10:
-            result_msg += "<b>Failed Channels:</b>\n"
-            for idx, channel in enumerate(failed_channels, 1):
-                result_msg += f"{idx}. {channel['channel_name']} - {channel['error']}\n"
-        else:
-            result_msg += "<i>Too many failed channels to display (see logs for details)</i>\n"
+    if delete_after:
+        scheduler.schedule("post", post_id, post_data["delete_after"])
 
-    reply_markup = InlineKeyboardMarkup([
-        [InlineKeyboardButton("🗑 Delete This Post", callback_data=f"delete_{post_id}")]
-    ])
+    time_str = format_time(delete_after) if delete_after else None
+    report = {
+        "title": "Forwarding Completed!",
+        "post_id": post_id,
+        "user_id": message.from_user.id,
+        "success_count": success_count,
+        "total_channels": total_channels,
+        "delete_after": delete_after,
+        "delete_at": post_data.get("delete_after"),
+        "failed_channels": failed_channels,
+        "confirmation_msg_id": processing_msg.id,
+        "reply_markup": InlineKeyboardMarkup([
+            [InlineKeyboardButton("🗑 Delete This Post", callback_data=f"delete_{post_id}")]
+        ])
+    }
 
-    await processing_msg.edit_text(result_msg, reply_markup=reply_markup)
+    await processing_msg.edit_text(render_post_result(report), reply_markup=report["reply_markup"])
 
     try:
         log_msg = (
@@ -436,19 +502,9 @@ async def forward_post(client, message: Message):
             if len(failed_channels) > 15:
                 log_msg += f"  ...and {len(failed_channels)-15} more"
         
-        await client.send_message(
-            chat_id=LOG_CHANNEL,
-            text=log_msg
-        )    
+        log_queue.put(log_msg)
     except Exception as e:
-        print(f"Error sending confirmation to log channel: {e}")
-
-    if delete_after and deletion_tasks:
-        asyncio.create_task(
-            handle_deletion_results(
-                client=client,
-                deletion_tasks=deletion_tasks,
-                post_id=post_id,
-                delay_seconds=delete_after
-            )
-	)
+        print(f"Error queueing confirmation for log channel: {e}")
+
+    # Channels that failed on a FloodWait or transient error are retried in the background
+    queue_failed_channels(client, report, send_func)
@@ -163,6 +163,14 @@ async def stats_menu(client, query: CallbackQuery):
 📢 <b>Total Channels:</b> <code>{total_channels}</code>
 ⏰ <b>Uptime:</b> <code>{uptime_str}</code>
 """
+    if hasattr(client, "limiter"):
+        text += "\n<b>🚦 Rate Limiter</b> <i>(queued / avg wait / paused)</i>\n"
+        for name, lane_stats in client.limiter.stats().items():
+            text += (
+                f"• <b>{name.capitalize()}:</b> <code>{lane_stats['queued']}</code> / "
+                f"<code>{lane_stats['avg_wait']:.2f}s</code> / "
+                f"<code>{int(lane_stats['paused_for'])}s</code>\n"
+            )
     buttons = InlineKeyboardMarkup([
         [InlineKeyboardButton("🔄 Refresh", callback_data="admin_stats"),
          InlineKeyboardButton("🔙 Back", callback_data="back_to_main")]
@@ -192,6 +200,38 @@ async def backup_menu(client, query: CallbackQuery):
     await query.edit_message_text(text, reply_markup=buttons)
     await query.answer()
 
+# ==================================== DATABASE STATS ====================================
+
+@Client.on_message(filters.command("dbstats") & admin_filter)
+async def db_stats(client, message):
+    usage = await db.index_usage()
+    text = "<b>🗄 Index Usage</b> <i>(ops since server restart)</i>\n\n"
+    for index in usage:
+        flag = " ⚠️" if index["ops"] == 0 else ""
+        text += f"• <code>{index['collection']}.{index['name']}</code>: <code>{index['ops']}</code>{flag}\n"
+
+    slow = list(db.slow_queries.slow)[-15:]
+    text += f"\n<b>🐢 Slow Queries</b> <i>(over {db.slow_queries.threshold_ms}ms, latest {len(slow)})</i>\n\n"
+    if not slow:
+        text += "<i>None recorded</i>\n"
+    for query in reversed(slow):
+        text += (
+            f"• <code>{query['command']}</code> {query['collection'] or ''} "
+            f"{query['filter']} - <code>{query['duration_ms']}ms</code> "
+            f"at <code>{query['at'].strftime('%H:%M:%S')}</code>\n"
+        )
+
+    cache = db.media_cache_stats
+    lookups = cache["hits"] + cache["misses"]
+    hit_rate = f" ({cache['hits'] * 100 / lookups:.0f}%)" if lookups else ""
+    text += (
+        f"\n<b>📦 Media Cache</b> <i>(lookups since restart)</i>\n\n"
+        f"• Entries: <code>{await db.media_cache.estimated_document_count()}</code>\n"
+        f"• Hits: <code>{cache['hits']}</code> / Misses: <code>{cache['misses']}</code>{hit_rate}\n"
+    )
+
+    await message.reply(text)
+
 # ==================================== BACK BUTTON ====================================
 # ==================================== ORIGINAL COMMANDS (KEPT FOR COMPATIBILITY) ====================================
 
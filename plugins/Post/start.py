@@ -2,6 +2,8 @@ from pyrogram import Client, filters
 from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery, Message, BotCommand
 from config import *
 from plugins.helper.db import db
+from plugins.helper.log_queue import log_queue
+from plugins.Post.constants import LOG_TEXT
 import random
 from plugins.Post.admin_panel import admin_filter
 
@@ -15,10 +17,9 @@ async def start(client, message: Message):
         pass
 
     # Add user to the database if they don't exist
-    if not await db.is_user_exist(message.from_user.id):
-        await db.add_user(message.from_user.id)
+    if await db.register_user(message.from_user.id):
         total_users = await db.total_users_count()
-        await client.send_message(LOG_CHANNEL, LOG_TEXT.format(message.from_user.mention, message.from_user.id, total_users))
+        log_queue.put(LOG_TEXT.format(message.from_user.mention, message.from_user.id, total_users))
 
     # Welcome message
     txt = (
@@ -0,0 +1,41 @@
+import asyncio
+from config import FANOUT_CONCURRENCY
+from plugins.helper.rate_limiter import lane, SYSTEM
+
+MAX_IDS_PER_CALL = 100  # Telegram limit for a single delete_messages call
+PRIVATE = "private"  # Group key for every user chat
+
+
+async def delete_in_batches(client, targets, concurrency=FANOUT_CONCURRENCY):
+    """
+    Delete (chat_id, message_id) pairs with one delete_messages call per chat per 100 ids.
+    Private chats share the bot's message id space, so messages in different private
+    chats are batched together as well. Chats are processed concurrently.
+    Returns {(chat_id, message_id): error or None}.
+    """
+    by_chat = {}
+    for chat_id, message_id in targets:
+        key = chat_id if chat_id < 0 else PRIVATE
+        by_chat.setdefault(key, []).append((chat_id, message_id))
+
+    results = {}
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def delete_chat(pairs):
+        async with semaphore:
+            for i in range(0, len(pairs), MAX_IDS_PER_CALL):
+                chunk = pairs[i:i + MAX_IDS_PER_CALL]
+                try:
+                    with lane(SYSTEM):
+                        await client.delete_messages(
+                            chat_id=chunk[0][0],
+                            message_ids=[message_id for _, message_id in chunk]
+                        )
+                    error = None
+                except Exception as e:
+                    error = str(e)
+                for pair in chunk:
+                    results[pair] = error
+
+    await asyncio.gather(*(delete_chat(pairs) for pairs in by_chat.values()))
+    return results
@@ -0,0 +1,176 @@
+import asyncio
+import datetime
+import logging
+import time
+from pyrogram.errors import FloodWait, InputUserDeactivated, UserIsBlocked, PeerIdInvalid
+from config import BROADCAST_WORKERS
+from plugins.helper.db import db
+from plugins.helper.rate_limiter import lane, BROADCAST
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_INTERVAL = 5  # Seconds between checkpoint writes
+REPORT_INTERVAL = 10  # Seconds between status message edits
+
+running = {}  # broadcast_id -> Broadcast, for /cancel_broadcast
+
+
+async def send_to_user(client, user_id, from_chat_id, message_id):
+    """Copy one message to a user. Returns (status, sent_message): 200 sent, 400 dead user, 500 other error."""
+    while True:
+        try:
+            sent = await client.copy_message(int(user_id), from_chat_id, message_id)
+            return 200, sent
+        except FloodWait:
+            # The limiter has already paused the broadcast lane, retrying waits it out
+            continue
+        except InputUserDeactivated:
+            logger.info(f"{user_id} : deactivated")
+            return 400, None
+        except UserIsBlocked:
+            logger.info(f"{user_id} : blocked the bot")
+            return 400, None
+        except PeerIdInvalid:
+            logger.info(f"{user_id} : user id invalid")
+            return 400, None
+        except Exception as e:
+            logger.error(f"{user_id} : {e}")
+            return 500, None
+
+
+class Broadcast:
+    """
+    One broadcast job: users are streamed from a cursor in _id order into a bounded queue
+    served by BROADCAST_WORKERS senders. The checkpoint is the last user id before which
+    every user has been handled, so a resumed job restarts right after it.
+    """
+
+    def __init__(self, client, job, on_sent=None, on_done=None):
+        self.client = client
+        self.job = job
+        self.id = job["_id"]
+        self.on_sent = on_sent
+        self.on_done = on_done
+        self.cancelled = asyncio.Event()
+        self.checkpoint = job.get("checkpoint")
+        self.done = job.get("done", 0)
+        self.success = job.get("success", 0)
+        self.failed = job.get("failed", 0)
+        self._in_flight = {}  # seq -> user_id, until every earlier seq has finished too
+        self._finished = set()
+        self._next_commit = 0
+        self._last_save = time.time()
+        self._last_report = time.time()
+
+    async def run(self):
+        running[self.id] = self
+        queue = asyncio.Queue(maxsize=BROADCAST_WORKERS * 2)
+        workers = [asyncio.create_task(self._worker(queue)) for _ in range(BROADCAST_WORKERS)]
+        status = None
+        try:
+            seq = 0
+            async for user in db.iter_users(after_id=self.checkpoint):
+                if self.cancelled.is_set():
+                    break
+                self._in_flight[seq] = user["_id"]
+                await queue.put((seq, user["_id"]))
+                seq += 1
+        except Exception as e:
+            logger.error(f"Broadcast {self.id} stopped reading users: {e}")
+            status = "failed"
+        finally:
+            # Always release the workers, or they wait on the queue forever
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+            running.pop(self.id, None)
+            await db.flush_user_deletions()
+            if self.on_done:
+                await self.on_done()
+
+        if status is None:
+            status = "cancelled" if self.cancelled.is_set() else "done"
+        await self._save(status)
+        await self._report(status)
+
+    def cancel(self):
+        self.cancelled.set()
+
+    async def _worker(self, queue):
+        with lane(BROADCAST):
+            while (item := await queue.get()) is not None:
+                if self.cancelled.is_set():
+                    # Left unfinished so the checkpoint stays before it
+                    continue
+                seq, user_id = item
+                try:
+                    await self._send(user_id)
+                except Exception as e:
+                    logger.error(f"Broadcast {self.id} failed for {user_id}: {e}")
+                self._finish(seq)
+                await self._tick()
+
+    async def _send(self, user_id):
+        status, sent = await send_to_user(self.client, user_id, self.job["from_chat_id"], self.job["message_id"])
+        if status == 200:
+            self.success += 1
+            if self.on_sent:
+                await self.on_sent(user_id, sent)
+        else:
+            self.failed += 1
+        if status == 400:
+            await db.queue_user_deletion(user_id)
+        self.done += 1
+
+    def _finish(self, seq):
+        self._finished.add(seq)
+        while self._next_commit in self._finished:
+            self._finished.remove(self._next_commit)
+            self.checkpoint = self._in_flight.pop(self._next_commit)
+            self._next_commit += 1
+
+    async def _tick(self):
+        now = time.time()
+        if now - self._last_save >= CHECKPOINT_INTERVAL:
+            self._last_save = now
+            await self._save("running")
+            await db.flush_user_deletions()
+        if now - self._last_report >= REPORT_INTERVAL:
+            self._last_report = now
+            await self._report("running")
+
+    async def _save(self, status):
+        await db.update_broadcast(self.id, {
+            "status": status,
+            "checkpoint": self.checkpoint,
+            "done": self.done,
+            "success": self.success,
+            "failed": self.failed
+        })
+
+    async def _report(self, status):
+        total = self.job.get("total", 0)
+        if status == "running":
+            title = "Broadcast in progress:"
+        elif status == "cancelled":
+            title = f"Broadcast cancelled:\nResume with /resume_broadcast {self.id}"
+        elif status == "failed":
+            title = f"Broadcast stopped by an error:\nResume with /resume_broadcast {self.id}"
+        else:
+            completed_in = datetime.timedelta(seconds=int(time.time() - self.job["started_at"]))
+            title = f"Broadcast Completed:\nCompleted in `{completed_in}`.\n"
+        try:
+            await self.client.edit_message_text(
+                self.job["status_chat_id"],
+                self.job["status_msg_id"],
+                f"**{title}\nTotal Users: {total}\nCompleted: {self.done} / {total}\nSuccess: {self.success}\nFailed: {self.failed}**"
+            )
+        except Exception as e:
+            logger.warning(f"Broadcast {self.id} status update failed: {e}")
+
+
+async def start_broadcast(client, job, on_sent=None, on_done=None):
+    """Run a broadcast job in the background and return it"""
+    broadcast = Broadcast(client, job, on_sent, on_done)
+    asyncio.create_task(broadcast.run())
+    return broadcast
@@ -8,11 +8,72 @@ import os
 import shutil
 import subprocess
 import json
+import logging
+import asyncio
+from collections import deque
+from pymongo import ASCENDING, DESCENDING, UpdateOne, monitoring
+from pymongo.errors import DuplicateKeyError
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """Keep the most recent database commands that took longer than `threshold_ms`"""
+
+    def __init__(self, threshold_ms, keep=50):
+        self.threshold_ms = threshold_ms
+        self.slow = deque(maxlen=keep)
+        self._running = {}
+
+    def started(self, event):
+        command = event.command
+        collection = command.get(event.command_name)
+        # Record only the shape of the query, never the values
+        query = command.get("filter")
+        shape = list(query.keys()) if isinstance(query, dict) else []
+        self._running[event.request_id] = (collection if isinstance(collection, str) else None, shape)
+
+    def succeeded(self, event):
+        collection, shape = self._running.pop(event.request_id, (None, []))
+        duration_ms = event.duration_micros / 1000
+        if duration_ms >= self.threshold_ms:
+            self.slow.append({
+                "command": event.command_name,
+                "collection": collection,
+                "filter": shape,
+                "duration_ms": round(duration_ms, 1),
+                "at": datetime.now()
+            })
+
+    def failed(self, event):
+        self._running.pop(event.request_id, None)
 
 
 class Database:
+    # Indexes every query in this class relies on, created by ensure_indexes at startup
+    INDEXES = {
+        "posts": [
+            ([("post_id", ASCENDING)], {"unique": True}),
+            ([("delete_after", ASCENDING)], {"sparse": True}),
+            ([("status", ASCENDING)], {"sparse": True}),
+        ],
+        "broadcast_deletions": [
+            ([("delete_at", ASCENDING)], {}),
+        ],
+        "invite_links": [
+            ([("status", ASCENDING)], {}),
+            ([("links.link", ASCENDING)], {}),
+        ],
+        "admins": [
+            ([("is_admin", ASCENDING)], {}),
+        ],
+        "user": [
+            ([("last_active", DESCENDING)], {}),
+            ([("join_date", DESCENDING)], {}),
+        ],
+    }
+
     def __init__(self, uri, database_name):
-        self._client = motor.motor_asyncio.AsyncIOMotorClient(uri)
+        self.slow_queries = SlowQueryListener(SLOW_QUERY_MS)
+        self._client = motor.motor_asyncio.AsyncIOMotorClient(uri, event_listeners=[self.slow_queries])
         self.db = self._client[database_name]
         self.col = self.db.user
         self.channels = self.db.channels
@@ -21,6 +82,21 @@ class Database:
         self.posts = self.db.posts
         self.settings = self.db.settings
         self.logs = self.db.logs
+        self.broadcasts = self.db.broadcasts
+        self.broadcast_deletions = self.db.broadcast_deletions
+        self.invite_links = self.db.invite_links
+        self.media_cache = self.db.media_cache
+        self.media_cache_stats = {"hits": 0, "misses": 0}  # Since startup, shown in /dbstats
+        self._admin_ids = set()  # In-memory admin set, see load_admins
+        self._admins_loaded_at = 0
+        self._admins_lock = asyncio.Lock()
+        self._channels = None  # In-memory channel registry, see load_channels
+        self._channel_tags = {}
+        self._channel_sync_task = None
+        self._user_count = None  # Cached user total, see total_users_count
+        self._user_count_at = 0
+        self._dead_users = set()  # Buffered for a bulk delete, see queue_user_deletion
+        self._known_users = set()  # Ids known to be registered, see register_user
 
     # ============ User System ============ #
     def new_user(self, id):
@@ -37,22 +113,71 @@ class Database:
         )
 
     async def add_user(self, id):
-        if not await self.is_user_exist(id):
-            user = self.new_user(id)
-            await self.col.insert_one(user)
+        await self.register_user(id)
+
+    async def register_user(self, id):
+        """Insert the user if missing in a single upsert. Returns True only for new users."""
+        id = int(id)
+        if id in self._known_users:
+            return False
+        user = self.new_user(id)
+        del user["_id"]
+        result = await self.col.update_one({'_id': id}, {'$setOnInsert': user}, upsert=True)
+        if len(self._known_users) >= KNOWN_USERS_MAX:
+            # Start over rather than grow without bound, active users repopulate it quickly
+            self._known_users.clear()
+        self._known_users.add(id)
+        if result.upserted_id is None:
+            return False
+        if self._user_count is not None:
+            self._user_count += 1
+        return True
 
     async def is_user_exist(self, id):
         user = await self.col.find_one({'_id': int(id)})
         return bool(user)
 
     async def total_users_count(self):
-        return await self.col.count_documents({})
+        """User total from collection metadata, cached and kept current by add/delete"""
+        if self._user_count is None or time.time() - self._user_count_at > USER_COUNT_TTL:
+            self._user_count = await self.col.estimated_document_count()
+            self._user_count_at = time.time()
+        return self._user_count
 
     async def get_all_users(self):
         return [user async for user in self.col.find({})]
 
+    async def iter_users(self, after_id=None, batch_size: int = 500):
+        """Stream user ids in _id order, starting after `after_id`"""
+        query = {"_id": {"$gt": after_id}} if after_id is not None else {}
+        cursor = self.col.find(query, {"_id": 1}).sort("_id", ASCENDING).batch_size(batch_size)
+        async for user in cursor:
+            yield user
+
     async def delete_user(self, user_id):
-        await self.col.delete_many({'_id': int(user_id)})
+        await self.delete_users([user_id])
+
+    async def delete_users(self, user_ids):
+        user_ids = [int(user_id) for user_id in user_ids]
+        self._known_users.difference_update(user_ids)
+        result = await self.col.delete_many({'_id': {'$in': user_ids}})
+        if self._user_count is not None:
+            self._user_count = max(0, self._user_count - result.deleted_count)
+
+    async def queue_user_deletion(self, user_id, batch_size: int = 500):
+        """Buffer a blocked/deactivated user and remove the buffer in one delete_many when full"""
+        self._dead_users.add(int(user_id))
+        if len(self._dead_users) >= batch_size:
+            await self.flush_user_deletions()
+
+    async def flush_user_deletions(self):
+        if not self._dead_users:
+            return
+        user_ids, self._dead_users = self._dead_users, set()
+        try:
+            await self.delete_users(user_ids)
+        except Exception as e:
+            await self.log_error(f"Error deleting {len(user_ids)} dead users: {e}")
 
     # ============ Admin System ============ #
     async def add_admin(self, user_id: int, admin_data: Optional[Dict] = None):
@@ -69,19 +194,30 @@ class Database:
             {"$set": admin_data},
             upsert=True
         )
+        self._admin_ids.add(user_id)
 
     async def remove_admin(self, user_id: int):
         """Remove admin privileges"""
         await self.admins.delete_one({"_id": user_id})
+        self._admin_ids.discard(user_id)
 
-    async def is_admin(self, user_id: int) -> bool:
-        """Check if user is admin with proper error handling"""
+    async def load_admins(self):
+        """(Re)load the in-memory admin set, keeping the old one if the database is unreachable"""
         try:
-            admin = await self.admins.find_one({"_id": user_id})
-            return admin is not None and admin.get("is_admin", False)
+            cursor = self.admins.find({"is_admin": True}, {"_id": 1})
+            self._admin_ids = {admin["_id"] async for admin in cursor}
+            self._admins_loaded_at = time.time()
         except Exception as e:
-            await self.log_error(f"Admin check error for {user_id}: {e}")
-            return False
+            await self.log_error(f"Error loading admins: {e}")
+
+    async def is_admin(self, user_id: int) -> bool:
+        """Check if user is admin, served from memory and refreshed every ADMIN_CACHE_TTL seconds"""
+        if time.time() - self._admins_loaded_at > ADMIN_CACHE_TTL:
+            async with self._admins_lock:
+                # Another caller may have refreshed while we waited for the lock
+                if time.time() - self._admins_loaded_at > ADMIN_CACHE_TTL:
+                    await self.load_admins()
+        return user_id in self._admin_ids
 
     async def get_admin(self, user_id: int) -> Optional[Dict]:
         """Get full admin data"""
@@ -102,24 +238,126 @@ class Database:
     async def add_channel(self, channel_id, channel_name=None):
         channel_id = int(channel_id)
         if not await self.is_channel_exist(channel_id):
-            await self.channels.insert_one({
+            channel = {
                 "_id": channel_id, 
                 "name": channel_name,
                 "added_date": datetime.now(),
                 "post_count": 0,
                 "last_post": None
-            })
+            }
+            await self.channels.insert_one(channel)
+            self._cache_channel(channel)
             return True
         return False
 
     async def delete_channel(self, channel_id):
         await self.channels.delete_one({"_id": int(channel_id)})
+        self._uncache_channel(int(channel_id))
 
     async def is_channel_exist(self, channel_id):
-        return await self.channels.find_one({"_id": int(channel_id)}) is not None
+        return await self.get_channel(channel_id) is not None
+
+    async def get_channel(self, channel_id):
+        if self._channels is None:
+            await self.load_channels()
+        return self._channels.get(int(channel_id))
 
     async def get_all_channels(self):
-        return [channel async for channel in self.channels.find({})]
+        """All connected channels, served from the in-memory registry"""
+        if self._channels is None:
+            await self.load_channels()
+        return list(self._channels.values())
+
+    async def get_channels_by_tag(self, tag):
+        if self._channels is None:
+            await self.load_channels()
+        return [self._channels[channel_id] for channel_id in self._channel_tags.get(tag, ())]
+
+    def _cache_channel(self, channel):
+        self._uncache_channel(channel["_id"])
+        self._channels[channel["_id"]] = channel
+        for tag in channel.get("tags", []):
+            self._channel_tags.setdefault(tag, set()).add(channel["_id"])
+
+    def _uncache_channel(self, channel_id):
+        if self._channels is None:
+            return
+        channel = self._channels.pop(channel_id, None)
+        for tag in (channel or {}).get("tags", []):
+            self._channel_tags.get(tag, set()).discard(channel_id)
+
+    async def load_channels(self):
+        """(Re)build the channel registry from the database"""
+        try:
+            channels = [channel async for channel in self.channels.find({})]
+        except Exception as e:
+            await self.log_error(f"Error loading channels: {e}")
+            if self._channels is None:
+                self._channels = {}
+            return
+        self._channels, self._channel_tags = {}, {}
+        for channel in channels:
+            self._cache_channel(channel)
+
+    def start_channel_sync(self):
+        if self._channel_sync_task is None or self._channel_sync_task.done():
+            self._channel_sync_task = asyncio.create_task(self._sync_channels())
+
+    async def _sync_channels(self):
+        """Follow channel changes made by other replicas, polling when change streams are unavailable"""
+        warned = False
+        while True:
+            try:
+                async with self.channels.watch(full_document="updateLookup") as stream:
+                    # Catch up on anything missed before the stream opened
+                    await self.load_channels()
+                    async for change in stream:
+                        if change["operationType"] == "delete":
+                            self._uncache_channel(change["documentKey"]["_id"])
+                        elif change.get("fullDocument"):
+                            self._cache_channel(change["fullDocument"])
+            except Exception as e:
+                if not warned:
+                    logging.warning(f"Channel change stream unavailable, polling every {CHANNEL_POLL_INTERVAL}s: {e}")
+                    warned = True
+            await asyncio.sleep(CHANNEL_POLL_INTERVAL)
+            await self.load_channels()
+
+    async def cache_invite_links(self, expiry_class, links):
+        """Store {channel_id: {"link", "expire_at"}} under invite_links.<expiry_class> of each channel"""
+        if not links:
+            return
+        try:
+            await self.channels.bulk_write([
+                UpdateOne({"_id": channel_id}, {"$set": {f"invite_links.{expiry_class}": info}})
+                for channel_id, info in links.items()
+            ], ordered=False)
+        except Exception as e:
+            await self.log_error(f"Error caching invite links: {e}")
+        for channel_id, info in links.items():
+            channel = (self._channels or {}).get(channel_id)
+            if channel is not None:
+                channel.setdefault("invite_links", {})[expiry_class] = info
+
+    async def forget_invite_links(self, links):
+        """Drop cached invite links that were revoked. `links` holds channel_id, expiry_class and link."""
+        links = [link for link in links if link.get("expiry_class")]
+        if not links:
+            return
+        try:
+            await self.channels.bulk_write([
+                UpdateOne(
+                    {"_id": link["channel_id"], f"invite_links.{link['expiry_class']}.link": link["link"]},
+                    {"$unset": {f"invite_links.{link['expiry_class']}": ""}}
+                )
+                for link in links
+            ], ordered=False)
+        except Exception as e:
+            await self.log_error(f"Error forgetting invite links: {e}")
+        for link in links:
+            cached = (self._channels or {}).get(link["channel_id"], {}).get("invite_links", {})
+            if cached.get(link["expiry_class"], {}).get("link") == link["link"]:
+                del cached[link["expiry_class"]]
 
     async def increment_channel_post(self, channel_id):
         await self.channels.update_one(
@@ -132,14 +370,16 @@ class Database:
 
     # ============ Post System ============ #
     async def save_post(self, post_data):
+        """Insert a new post, bumping post_id until it is free so posts in the same second don't share a job"""
         post_data["timestamp"] = datetime.now()
         try:
-            await self.posts.update_one(
-                {"post_id": post_data["post_id"]},
-                {"$set": post_data},
-                upsert=True
-            )
-            return True
+            while True:
+                try:
+                    await self.posts.insert_one(post_data)
+                    return True
+                except DuplicateKeyError:
+                    post_data.pop("_id", None)
+                    post_data["post_id"] += 1
         except Exception as e:
             await self.log_error(f"Error saving post: {e}")
             return False
@@ -151,6 +391,13 @@ class Database:
             await self.log_error(f"Error retrieving post: {e}")
             return None
 
+    async def get_posts(self, post_ids):
+        try:
+            return await self.posts.find({"post_id": {"$in": list(post_ids)}}).to_list(None)
+        except Exception as e:
+            await self.log_error(f"Error retrieving posts: {e}")
+            return []
+
     async def delete_post(self, post_id):
         try:
             await self.posts.delete_one({"post_id": post_id})
@@ -159,13 +406,63 @@ class Database:
             await self.log_error(f"Error deleting post: {e}")
             return False
 
-    async def get_pending_deletions(self):
+    async def iter_pending_deletions(self, batch_size: int = 500):
+        """Stream every post with an auto-delete deadline, overdue ones included"""
         try:
-            return await self.posts.find({
-                "delete_after": {"$gt": time.time()}
-            }).to_list(None)
+            cursor = self.posts.find(
+                {"delete_after": {"$exists": True}},
+                {"_id": 0, "post_id": 1, "delete_after": 1}
+            ).batch_size(batch_size)
+            async for post in cursor:
+                yield post
         except Exception as e:
             await self.log_error(f"Error getting pending deletions: {e}")
+
+    async def clear_post_deadlines(self, post_ids):
+        """Drop the auto-delete deadline once a post's deletion has been attempted"""
+        try:
+            await self.posts.update_many(
+                {"post_id": {"$in": list(post_ids)}},
+                {"$unset": {"delete_after": ""}}
+            )
+        except Exception as e:
+            await self.log_error(f"Error clearing post deadlines: {e}")
+
+    async def add_channel_post(self, post_id, channel_data):
+        try:
+            result = await self.posts.update_one(
+                {"post_id": post_id},
+                {"$push": {"channels": channel_data}}
+            )
+            return result.modified_count > 0
+        except Exception as e:
+            await self.log_error(f"Error adding channel post: {e}")
+            return False
+
+    async def add_failed_channel(self, post_id, channel_data):
+        try:
+            await self.posts.update_one(
+                {"post_id": post_id},
+                {"$push": {"failed_channels": channel_data}}
+            )
+        except Exception as e:
+            await self.log_error(f"Error adding failed channel: {e}")
+
+    async def finish_post(self, post_id):
+        """Mark a post's fan-out as complete and drop the outbox-only fields"""
+        try:
+            await self.posts.update_one(
+                {"post_id": post_id},
+                {"$set": {"status": "done"}, "$unset": {"targets": "", "failed_channels": ""}}
+            )
+        except Exception as e:
+            await self.log_error(f"Error finishing post: {e}")
+
+    async def get_unfinished_posts(self):
+        try:
+            return await self.posts.find({"status": "sending"}).to_list(None)
+        except Exception as e:
+            await self.log_error(f"Error getting unfinished posts: {e}")
             return []
 
     async def remove_channel_post(self, post_id, channel_id):
@@ -179,6 +476,17 @@ class Database:
             await self.log_error(f"Error removing channel post: {e}")
             return False
 
+    async def remove_channel_posts(self, post_id, channel_ids):
+        try:
+            result = await self.posts.update_one(
+                {"post_id": post_id},
+                {"$pull": {"channels": {"channel_id": {"$in": list(channel_ids)}}}}
+            )
+            return result.modified_count > 0
+        except Exception as e:
+            await self.log_error(f"Error removing channel posts: {e}")
+            return False
+
     async def get_post_channels(self, post_id):
         try:
             post = await self.posts.find_one({"post_id": post_id})
@@ -194,6 +502,143 @@ class Database:
             await self.log_error(f"Error retrieving posts: {e}")
             return []
 
+    # ============ Broadcast System ============ #
+    async def create_broadcast(self, job):
+        await self.broadcasts.insert_one(job)
+
+    async def update_broadcast(self, broadcast_id, fields):
+        try:
+            await self.broadcasts.update_one({"_id": broadcast_id}, {"$set": fields})
+        except Exception as e:
+            await self.log_error(f"Error updating broadcast {broadcast_id}: {e}")
+
+    async def get_broadcasts(self, status):
+        return await self.broadcasts.find({"status": status}).sort("_id", DESCENDING).to_list(None)
+
+    async def add_broadcast_deletions(self, deletions):
+        try:
+            await self.broadcast_deletions.insert_many(deletions, ordered=False)
+        except Exception as e:
+            await self.log_error(f"Error saving broadcast deletions: {e}")
+
+    async def get_due_broadcast_deletions(self, now, limit: int = 1000):
+        return await self.broadcast_deletions.find(
+            {"delete_at": {"$lte": now}},
+            {"chat_id": 1, "message_id": 1}
+        ).limit(limit).to_list(None)
+
+    async def remove_broadcast_deletions(self, ids):
+        await self.broadcast_deletions.delete_many({"_id": {"$in": list(ids)}})
+
+    async def iter_broadcast_deletion_times(self, batch_size: int = 1000):
+        """Stream the deadline of every pending broadcast deletion"""
+        cursor = self.broadcast_deletions.find({}, {"_id": 0, "delete_at": 1}).batch_size(batch_size)
+        async for deletion in cursor:
+            yield deletion["delete_at"]
+
+    # ============ Invite Link System ============ #
+    async def save_link_set(self, link_set):
+        await self.invite_links.insert_one(link_set)
+
+    async def get_link_sets(self, set_ids):
+        return await self.invite_links.find({"_id": {"$in": list(set_ids)}}).to_list(None)
+
+    async def get_active_link_sets(self):
+        return await self.invite_links.find({"status": "active"}).to_list(None)
+
+    async def get_shared_links(self, links, exclude_ids):
+        """Those of `links` that an active set outside `exclude_ids` still shows"""
+        links = set(links)
+        shared = set()
+        cursor = self.invite_links.find(
+            {"status": "active", "_id": {"$nin": list(exclude_ids)}, "links.link": {"$in": list(links)}},
+            {"links.link": 1}
+        )
+        async for link_set in cursor:
+            shared.update(link["link"] for link in link_set["links"])
+        return shared & links
+
+    async def release_links(self, links, exclude_ids):
+        """Drop revoked `links` from other active sets; sets left with no links are marked revoked"""
+        try:
+            await self.invite_links.update_many(
+                {"status": "active", "_id": {"$nin": list(exclude_ids)}, "links.link": {"$in": list(links)}},
+                {"$pull": {"links": {"link": {"$in": list(links)}}}}
+            )
+            await self.invite_links.update_many(
+                {"status": "active", "links": {"$size": 0}},
+                {"$set": {"status": "revoked", "revoked_at": time.time()}}
+            )
+        except Exception as e:
+            await self.log_error(f"Error releasing revoked links: {e}")
+
+    async def finish_link_sets(self, set_ids):
+        """Mark link sets as revoked so neither the button nor a restart revokes them again"""
+        try:
+            await self.invite_links.update_many(
+                {"_id": {"$in": list(set_ids)}},
+                {"$set": {"status": "revoked", "revoked_at": time.time()}}
+            )
+        except Exception as e:
+            await self.log_error(f"Error finishing link sets {set_ids}: {e}")
+
+    # ============ Media Cache ============ #
+    async def get_cached_media(self, file_unique_id):
+        """Bot-side copy of a source file, counting the lookup as a hit or miss. A failed read is a miss."""
+        try:
+            media = await self.media_cache.find_one_and_update({"_id": file_unique_id}, {"$inc": {"hits": 1}})
+        except Exception as e:
+            await self.log_error(f"Error reading cached media {file_unique_id}: {e}")
+            media = None
+        self.media_cache_stats["hits" if media else "misses"] += 1
+        return media
+
+    async def cache_media(self, file_unique_id, media):
+        try:
+            await self.media_cache.update_one(
+                {"_id": file_unique_id},
+                {"$set": media, "$setOnInsert": {"hits": 0, "cached_at": datetime.now()}},
+                upsert=True
+            )
+        except Exception as e:
+            await self.log_error(f"Error caching media {file_unique_id}: {e}")
+
+    async def drop_cached_media(self, file_unique_id):
+        try:
+            await self.media_cache.delete_one({"_id": file_unique_id})
+        except Exception as e:
+            await self.log_error(f"Error dropping cached media {file_unique_id}: {e}")
+
+    # ============ Indexes ============ #
+    async def ensure_indexes(self):
+        """Create any missing index from INDEXES, logging (not raising) on conflicts"""
+        for collection, indexes in self.INDEXES.items():
+            for keys, options in indexes:
+                try:
+                    await self.db[collection].create_index(keys, **options)
+                except Exception as e:
+                    await self.log_error(f"Error creating index {keys} on {collection}: {e}")
+
+    async def index_usage(self):
+        """Per-index operation counts since the server last restarted"""
+        usage = []
+        for collection in self.INDEXES:
+            try:
+                async for stat in self.db[collection].aggregate([{"$indexStats": {}}]):
+                    usage.append({
+                        "collection": collection,
+                        "name": stat["name"],
+                        "ops": stat["accesses"]["ops"],
+                        "since": stat["accesses"]["since"]
+                    })
+            except Exception as e:
+                await self.log_error(f"Error reading index stats for {collection}: {e}")
+        return usage
+
+    # ============ Logging ============ #
+    async def log_error(self, error):
+        logging.error(error)
+
     # ============ admin panel Methods ===========
 
             
@@ -0,0 +1,68 @@
+import asyncio
+from config import FANOUT_CONCURRENCY
+from plugins.helper.rate_limiter import lane, POSTING
+from plugins.helper.retry_queue import retry_after
+
+
+async def run_concurrently(items, func, concurrency=FANOUT_CONCURRENCY, lane_name=POSTING):
+    """
+    Await `func(item)` for every item with at most `concurrency` calls in flight,
+    all through the given rate limiter lane.
+    Returns [(ok, result or exception)] in the same order as `items`.
+    """
+    results = [None] * len(items)
+    pending = iter(enumerate(items))
+
+    async def worker():
+        with lane(lane_name):
+            for index, item in pending:
+                try:
+                    results[index] = (True, await func(item))
+                except Exception as e:
+                    results[index] = (False, e)
+
+    # Workers share one iterator, so each item is picked up exactly once
+    workers = max(1, min(concurrency, len(items)))
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return results
+
+
+async def fan_out(channels, send_func, concurrency=FANOUT_CONCURRENCY, label="posting", lane_name=POSTING, on_result=None):
+    """
+    Send to every channel concurrently with at most `concurrency` sends in flight,
+    all through the given rate limiter lane.
+    `send_func(channel)` must return the sent message.
+    Returns (sent_messages, failed_channels), both in the same order as `channels`.
+    Failed entries carry `retry_after`, None when the error is not worth retrying.
+    `on_result(ok, entry)` is awaited as each channel finishes, e.g. to persist progress.
+    """
+    async def send(channel):
+        channel_name = channel.get("name", str(channel["_id"]))
+        try:
+            sent_message = await send_func(channel)
+            result = (True, {
+                "channel_id": channel["_id"],
+                "message_id": sent_message.id,
+                "channel_name": channel_name
+            })
+        except Exception as e:
+            error_msg = str(e)[:200]  # Truncate long error messages
+            print(f"Error {label} to channel {channel['_id']}: {error_msg}")
+            result = (False, {
+                "channel_id": channel["_id"],
+                "channel_name": channel_name,
+                "error": error_msg,
+                "retry_after": retry_after(e)
+            })
+
+        if on_result:
+            try:
+                await on_result(*result)
+            except Exception as e:
+                print(f"Error recording result for channel {channel['_id']}: {e}")
+        return result
+
+    results = [result for _, result in await run_concurrently(channels, send, concurrency, lane_name)]
+    sent_messages = [data for ok, data in results if ok]
+    failed_channels = [data for ok, data in results if not ok]
+    return sent_messages, failed_channels
@@ -0,0 +1,86 @@
+import asyncio
+import logging
+from collections import deque
+from pyrogram import enums
+from pyrogram.errors import FloodWait
+from config import LOG_CHANNEL, LOG_FLUSH_INTERVAL, LOG_QUEUE_MAX
+from plugins.helper.rate_limiter import lane, LOGS
+
+logger = logging.getLogger(__name__)
+
+MAX_MESSAGE_LENGTH = 4096
+SEPARATOR = "\n\n"
+
+
+class LogQueue:
+    """
+    Collects LOG_CHANNEL events and sends them as one digest every `interval` seconds,
+    split at Telegram's message limit. put() never waits: when `max_pending` events are
+    already queued the oldest is dropped and counted in the next digest.
+    """
+
+    def __init__(self, chat_id=LOG_CHANNEL, interval=LOG_FLUSH_INTERVAL, max_pending=LOG_QUEUE_MAX):
+        self.chat_id = chat_id
+        self.interval = interval
+        self.pending = deque(maxlen=max_pending)
+        self.dropped = 0
+        self.client = None
+        self._task = None
+
+    def start(self, client):
+        self.client = client
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def put(self, text):
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        if len(text) > MAX_MESSAGE_LENGTH:
+            # Cut at a line break so tags and markdown on the kept lines stay closed
+            cut = text.rfind("\n", 0, MAX_MESSAGE_LENGTH - 2)
+            text = text[:cut if cut > 0 else MAX_MESSAGE_LENGTH - 2] + "\n…"
+        self.pending.append(text)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing log queue: {e}")
+
+    def _digests(self):
+        events = list(self.pending)
+        self.pending.clear()
+        if self.dropped:
+            events.append(f"⚠️ <i>{self.dropped} log event(s) dropped while the queue was full</i>")
+            self.dropped = 0
+
+        chunk = ""
+        for event in events:
+            if chunk and len(chunk) + len(SEPARATOR) + len(event) > MAX_MESSAGE_LENGTH:
+                yield chunk
+                chunk = ""
+            chunk = chunk + SEPARATOR + event if chunk else event
+        if chunk:
+            yield chunk
+
+    async def flush(self):
+        if self.client is None:
+            return
+        with lane(LOGS):
+            for digest in self._digests():
+                try:
+                    await self.client.send_message(self.chat_id, digest, disable_web_page_preview=True)
+                except FloodWait as e:
+                    logger.error(f"Error sending log digest: {e}")
+                except Exception as e:
+                    # Most likely broken markup in one of the events, don't lose the whole digest over it
+                    logger.warning(f"Log digest rejected ({e}), sending it as plain text")
+                    try:
+                        await self.client.send_message(self.chat_id, digest, parse_mode=enums.ParseMode.DISABLED, disable_web_page_preview=True)
+                    except Exception as e:
+                        logger.error(f"Error sending log digest: {e}")
+
+
+log_queue = LogQueue()
@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import math
+import mimetypes
+import os
+from config import PARALLEL_DOWNLOAD_PARTS, PARALLEL_DOWNLOAD_MIN_MB
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024  # stream_media yields 1 MiB chunks and takes offsets in chunks
+DOWNLOAD_DIR = "downloads"
+
+
+def download_dir(msg, task):
+    """
+    Folder of its own for every source message within a save task. `task` is unique per save,
+    so two users saving the same post at once never share a path.
+    """
+    return os.path.join(DOWNLOAD_DIR, f"{task}_{msg.chat.id}_{msg.id}", "")
+
+
+def download_path(acc, msg, media, task):
+    """Same file name download_media would pick, inside the message's own folder"""
+    file_name = getattr(media, "file_name", None)
+    if not file_name:
+        extension = mimetypes.guess_extension(getattr(media, "mime_type", None) or "") or ""
+        file_name = f"{type(media).__name__.lower()}_{msg.id}{extension}"
+    return os.path.join(str(getattr(acc, "PARENT_DIR", "")), download_dir(msg, task), file_name)
+
+
+def remove_download(path):
+    """Delete a downloaded file and, once it is empty, the message folder it was saved in"""
+    if not path or not os.path.exists(path):
+        return
+    os.remove(path)
+    folder = os.path.dirname(path)
+    if os.path.basename(os.path.dirname(folder)) == DOWNLOAD_DIR:
+        try:
+            os.rmdir(folder)
+        except OSError:
+            pass
+
+
+async def download(acc, msg, media, task, progress=None):
+    """
+    Download the media of `msg` through the user session, into the message's own folder for `task`.
+    Files of at least PARALLEL_DOWNLOAD_MIN_MB are fetched as PARALLEL_DOWNLOAD_PARTS byte ranges
+    at once, each written straight into its place in a preallocated file. Smaller files, and any
+    parallel download that fails, go through the regular download_media.
+    `progress(current, total)` is awaited with the bytes received across all parts.
+    """
+    size = media.file_size or 0
+    if PARALLEL_DOWNLOAD_PARTS < 2 or size < PARALLEL_DOWNLOAD_MIN_MB * 1024 * 1024:
+        return await acc.download_media(msg, file_name=download_dir(msg, task), progress=progress)
+
+    path = download_path(acc, msg, media, task)
+    try:
+        await download_parts(acc, msg, path, size, progress)
+        return path
+    except Exception as e:
+        logger.warning(f"Parallel download of {msg.id} failed, retrying as one stream: {e}")
+        remove_download(path)
+        return await acc.download_media(msg, file_name=download_dir(msg, task), progress=progress)
+
+
+async def download_parts(acc, msg, path, size, progress):
+    chunks = math.ceil(size / CHUNK_SIZE)
+    per_part = math.ceil(chunks / PARALLEL_DOWNLOAD_PARTS)
+    received = 0
+
+    async def fetch_part(first):
+        nonlocal received
+        position = first * CHUNK_SIZE
+        async for chunk in acc.stream_media(msg, limit=min(per_part, chunks - first), offset=first):
+            os.pwrite(fd, chunk, position)
+            position += len(chunk)
+            received += len(chunk)
+            if progress:
+                await progress(received, size)
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    try:
+        os.ftruncate(fd, size)
+        parts = [asyncio.create_task(fetch_part(first)) for first in range(0, chunks, per_part)]
+        try:
+            await asyncio.gather(*parts)
+        except BaseException:
+            for part in parts:
+                part.cancel()
+            raise
+    finally:
+        os.close(fd)
+
+    if received != size:
+        raise IOError(f"received {received} of {size} bytes")
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+import time
+from config import PROGRESS_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+active = {}  # (chat_id, message_id) -> Progress, for every transfer currently reporting
+
+
+def format_time(seconds):
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours}h {minutes}m {seconds}s" if hours else f"{minutes}m {seconds}s"
+
+
+class Progress:
+    """
+    Progress of one transfer, reported on a status message.
+    `update` is passed to pyrogram as the progress callback and only stores numbers;
+    a single renderer task edits the status message every `interval` seconds.
+    Call `finish()` when the transfer is over, whatever the outcome.
+    """
+
+    def __init__(self, client, status_msg, title, interval=PROGRESS_INTERVAL):
+        self.client = client
+        self.chat_id = status_msg.chat.id
+        self.message_id = status_msg.id
+        self.interval = interval
+        self.reset(title)
+        active[(self.chat_id, self.message_id)] = self
+        self._task = asyncio.create_task(self._render_loop())
+
+    def reset(self, title):
+        """Start reporting a new phase, e.g. upload after download"""
+        self.title = title
+        self.current = 0
+        self.total = 0
+        self.started = time.time()
+        self._rendered = None
+
+    async def update(self, current, total):
+        self.current = current
+        self.total = total
+
+    def text(self):
+        elapsed = time.time() - self.started
+        percent = self.current * 100 / self.total
+        speed = self.current / elapsed if elapsed > 0 else 0
+        eta = format_time((self.total - self.current) / speed) if speed > 0 else "Calculating..."
+        filled = int(10 * percent / 100)
+        return (
+            f"> **{self.title}** \n\n"
+            f"**{'▰' * filled + '▱' * (10 - filled)}**\n"
+            f"**📈 Progress**: {percent:.1f}%\n"
+            f"**📦 Processed**: {self.current / (1024 * 1024):.2f}MB / {self.total / (1024 * 1024):.2f}MB\n"
+            f"**⚡ Speed**: {speed / (1024 * 1024):.2f} MB/s\n"
+            f"**⏱️ Elapsed Time**: {format_time(elapsed)}\n"
+            f"**⏳ ETA**: {eta}"
+        )
+
+    async def _render_loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.total or (self.title, self.current) == self._rendered:
+                continue
+            self._rendered = (self.title, self.current)
+            try:
+                await self.client.edit_message_text(self.chat_id, self.message_id, self.text())
+            except Exception as e:
+                logger.debug(f"Progress update failed: {e}")
+
+    def finish(self):
+        self._task.cancel()
+        active.pop((self.chat_id, self.message_id), None)
@@ -0,0 +1,222 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from pyrogram.errors import FloodWait
+from config import GLOBAL_RATE_LIMIT, CHAT_RATE_LIMIT, FLOOD_RETRY_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+# Priority lanes, served in this order when the global bucket is contended
+SYSTEM = "system"            # Auto-deletions, link revocations
+INTERACTIVE = "interactive"  # Replies to admins and users (default)
+POSTING = "posting"          # Channel fan-out for /post, /fpost, /genlink
+BROADCAST = "broadcast"      # Mass sends to the user collection
+LOGS = "logs"                # LOG_CHANNEL digests
+LANES = (SYSTEM, INTERACTIVE, POSTING, BROADCAST, LOGS)
+
+# Raw functions that never consume a token (connection upkeep and file transfer)
+EXEMPT_PREFIXES = (
+    "functions.updates.",
+    "functions.help.",
+    "functions.auth.",
+    "functions.upload.",
+)
+
+# Raw functions that also count against the destination chat's own bucket
+CHAT_SCOPED = {
+    "functions.messages.SendMessage",
+    "functions.messages.SendMedia",
+    "functions.messages.SendMultiMedia",
+    "functions.messages.ForwardMessages",
+    "functions.messages.EditMessage",
+}
+
+_current_lane = contextvars.ContextVar("telegram_lane", default=INTERACTIVE)
+
+
+@contextmanager
+def lane(name):
+    """Route every API call made inside the block through the given lane"""
+    token = _current_lane.set(name)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+def _chat_key(query):
+    """Extract the destination chat of a raw query, if it has one"""
+    peer = getattr(query, "to_peer", None) or getattr(query, "peer", None)
+    for attr in ("channel_id", "chat_id", "user_id"):
+        value = getattr(peer, attr, None)
+        if value is not None:
+            return (attr, value)
+    return None
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def is_idle(self):
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self):
+        """Reserve a token, sleeping until it is due. Waiters are served in call order."""
+        self._refill()
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+class Lane:
+    def __init__(self, name, priority):
+        self.name = name
+        self.priority = priority
+        self.waiters = deque()
+        self.paused_until = 0.0
+        self.served = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.flood_waits = 0
+
+    def head(self):
+        """First live waiter, dropping any whose caller was cancelled"""
+        while self.waiters and self.waiters[0].done():
+            self.waiters.popleft()
+        return self.waiters[0] if self.waiters else None
+
+
+class RateLimiter:
+    """
+    Process-wide limiter for bot API calls.
+    A global token bucket is shared by all lanes and handed out in lane priority order,
+    sends are additionally limited per destination chat, and a FloodWait pauses only
+    the lane whose call triggered it.
+    """
+
+    def __init__(self, rate=GLOBAL_RATE_LIMIT, chat_rate=CHAT_RATE_LIMIT):
+        self.bucket = TokenBucket(rate, max(1, rate))
+        self.chat_rate = chat_rate
+        self.chat_buckets = {}
+        self.lanes = {name: Lane(name, priority) for priority, name in enumerate(LANES)}
+        self._wakeup = asyncio.Event()
+        self._pump_task = None
+
+    # ============ Scheduling ============ #
+    def _chat_bucket(self, key):
+        bucket = self.chat_buckets.get(key)
+        if bucket is None:
+            if len(self.chat_buckets) >= 10000:
+                # Forget chats that have been quiet long enough to refill completely
+                self.chat_buckets = {k: b for k, b in self.chat_buckets.items() if not b.is_idle()}
+            bucket = self.chat_buckets[key] = TokenBucket(self.chat_rate, 3)
+        return bucket
+
+    def _next_lane(self):
+        """Highest priority lane that has a waiter and is not paused"""
+        now = time.monotonic()
+        for name in LANES:
+            current = self.lanes[name]
+            if current.head() is not None and current.paused_until <= now:
+                return current
+        return None
+
+    def _next_resume(self):
+        now = time.monotonic()
+        paused = [l.paused_until - now for l in self.lanes.values() if l.waiters and l.paused_until > now]
+        return min(paused) if paused else None
+
+    async def _pump(self):
+        while True:
+            if self._next_lane() is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self._next_resume())
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self.bucket.acquire()
+            # Pick again: a higher priority waiter may have arrived while we waited
+            current = self._next_lane()
+            if current is None:
+                self.bucket.tokens += 1
+                continue
+            current.waiters.popleft().set_result(None)
+
+    async def acquire(self, lane_name=None, chat_key=None):
+        current = self.lanes[lane_name or _current_lane.get()]
+        start = time.monotonic()
+
+        if chat_key is not None and self.chat_rate > 0:
+            await self._chat_bucket(chat_key).acquire()
+
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.create_task(self._pump())
+
+        waiter = asyncio.get_running_loop().create_future()
+        current.waiters.append(waiter)
+        self._wakeup.set()
+        await waiter
+
+        waited = time.monotonic() - start
+        current.served += 1
+        current.total_wait += waited
+        current.max_wait = max(current.max_wait, waited)
+
+    def pause(self, lane_name, seconds):
+        current = self.lanes[lane_name]
+        current.paused_until = max(current.paused_until, time.monotonic() + seconds)
+        current.flood_waits += 1
+        logger.warning(f"FloodWait: pausing {lane_name} lane for {seconds}s")
+        self._wakeup.set()
+
+    # ============ Client hook ============ #
+    async def invoke(self, invoke, query, *args, **kwargs):
+        """Run a raw query through the limiter. FloodWaits pause the lane and are retried if short."""
+        name = getattr(query, "QUALNAME", "")
+        if name.startswith(EXEMPT_PREFIXES):
+            return await invoke(query, *args, **kwargs)
+
+        lane_name = _current_lane.get()
+        chat_key = _chat_key(query) if name in CHAT_SCOPED else None
+        if len(args) < 3:
+            # Let FloodWaits reach us instead of being slept on inside the session
+            kwargs.setdefault("sleep_threshold", 0)
+
+        while True:
+            await self.acquire(lane_name, chat_key)
+            try:
+                return await invoke(query, *args, **kwargs)
+            except FloodWait as e:
+                self.pause(lane_name, e.value)
+                if e.value > FLOOD_RETRY_THRESHOLD:
+                    raise
+
+    # ============ Stats ============ #
+    def stats(self):
+        now = time.monotonic()
+        return {
+            name: {
+                "queued": len(l.waiters),
+                "served": l.served,
+                "avg_wait": l.total_wait / l.served if l.served else 0.0,
+                "max_wait": l.max_wait,
+                "paused_for": max(0.0, l.paused_until - now),
+                "flood_waits": l.flood_waits,
+            }
+            for name, l in self.lanes.items()
+        }
@@ -0,0 +1,82 @@
+import asyncio
+import heapq
+import itertools
+import time
+from pyrogram.errors import FloodWait, InternalServerError, ServiceUnavailable
+from config import POST_RETRY_ATTEMPTS, POST_RETRY_DELAY, FANOUT_CONCURRENCY
+
+MAX_BACKOFF = 600
+
+
+def retry_after(error):
+    """Seconds to wait before retrying after `error`, or None if a retry won't help"""
+    if isinstance(error, FloodWait):
+        return error.value
+    if isinstance(error, (InternalServerError, ServiceUnavailable, TimeoutError, asyncio.TimeoutError, ConnectionError)):
+        return 0
+    return None
+
+
+class RetryQueue:
+    """
+    Background retries with exponential backoff that respects FloodWait.
+    A single worker sleeps until the earliest due retry, so queued jobs cost no tasks.
+    """
+
+    def __init__(self, max_attempts=POST_RETRY_ATTEMPTS, base_delay=POST_RETRY_DELAY, concurrency=FANOUT_CONCURRENCY):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self._heap = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._task = None
+
+    def __len__(self):
+        return len(self._heap)
+
+    def backoff(self, attempt):
+        return min(self.base_delay * 2 ** (attempt - 1), MAX_BACKOFF)
+
+    def submit(self, run, on_success, on_failure, attempt=1, delay=None):
+        """
+        Queue `run()` for a retry. `on_success(result)` or `on_failure(error)` is awaited
+        once it delivers or runs out of attempts.
+        """
+        if delay is None:
+            delay = self.backoff(attempt)
+        heapq.heappush(self._heap, (time.time() + delay, next(self._seq), run, on_success, on_failure, attempt))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+
+    async def _run(self):
+        while self._heap:
+            due = self._heap[0][0] - time.time()
+            if due > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), due)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, run, on_success, on_failure, attempt = heapq.heappop(self._heap)
+            asyncio.create_task(self._attempt(run, on_success, on_failure, attempt))
+
+    async def _attempt(self, run, on_success, on_failure, attempt):
+        try:
+            async with self._semaphore:
+                result = await run()
+        except Exception as e:
+            delay = retry_after(e)
+            if delay is not None and attempt < self.max_attempts:
+                self.submit(run, on_success, on_failure, attempt + 1, max(delay, self.backoff(attempt + 1)))
+                return
+            callback, value = on_failure, e
+        else:
+            callback, value = on_success, result
+
+        try:
+            await callback(value)
+        except Exception as e:
+            print(f"Error in retry callback: {e}")
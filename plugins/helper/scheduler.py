@@ -0,0 +1,98 @@
+import asyncio
+import heapq
+import time
+from config import DELETE_BATCH_WINDOW
+
+
+class DeadlineScheduler:
+    """
+    One min-heap of (deadline, kind, ref) entries served by a single task that sleeps
+    until the earliest deadline. Scheduling is O(log n); cancelling is O(1) and the
+    stale heap entry is dropped when it reaches the top.
+    Handlers are registered per kind and awaited as handler(client, refs) with every
+    ref of that kind that came due within the same `batch_window` seconds.
+    """
+
+    def __init__(self, batch_window=DELETE_BATCH_WINDOW):
+        self.batch_window = batch_window
+        self._heap = []
+        self._deadlines = {}
+        self._handlers = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.client = None
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def register(self, kind, handler):
+        self._handlers[kind] = handler
+
+    def start(self, client):
+        self.client = client
+        self._ensure_running()
+
+    def _ensure_running(self):
+        if self.client is not None and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._run())
+
+    def schedule(self, kind, ref, deadline):
+        """Fire `kind` for `ref` at the unix time `deadline`, replacing any earlier schedule"""
+        key = (kind, ref)
+        if self._deadlines.get(key) == deadline:
+            return
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, kind, ref))
+        self._ensure_running()
+        self._wakeup.set()
+
+    def cancel(self, kind, ref):
+        self._deadlines.pop((kind, ref), None)
+
+    def next_deadline(self):
+        """Earliest live deadline, discarding cancelled or rescheduled entries on the way"""
+        while self._heap:
+            deadline, kind, ref = self._heap[0]
+            if self._deadlines.get((kind, ref)) == deadline:
+                return deadline
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, until):
+        """Remove and return {kind: [refs]} for every entry due at or before `until`"""
+        due = {}
+        while (deadline := self.next_deadline()) is not None and deadline <= until:
+            _, kind, ref = heapq.heappop(self._heap)
+            del self._deadlines[(kind, ref)]
+            due.setdefault(kind, []).append(ref)
+        return due
+
+    async def _run(self):
+        while True:
+            deadline = self.next_deadline()
+            timeout = None if deadline is None else deadline - time.time()
+            if timeout is None or timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Let entries due moments later join this batch
+            await asyncio.sleep(self.batch_window)
+            for kind, refs in self.pop_due(time.time()).items():
+                handler = self._handlers.get(kind)
+                if handler is None:
+                    print(f"No handler registered for scheduled {kind}")
+                    continue
+                asyncio.create_task(self._dispatch(handler, kind, refs))
+
+    async def _dispatch(self, handler, kind, refs):
+        try:
+            await handler(self.client, refs)
+        except Exception as e:
+            print(f"Error running scheduled {kind}: {e}")
+
+
+scheduler = DeadlineScheduler()
@@ -0,0 +1,100 @@
+import asyncio
+import itertools
+import logging
+from pyrogram import Client
+from config import SESSION_STRING, API_ID, API_HASH, USER_SESSION_POOL_SIZE, USER_SESSION_HEALTH_INTERVAL, PARALLEL_DOWNLOAD_PARTS, RESTRICTED_DOWNLOADS
+
+logger = logging.getLogger(__name__)
+
+# Errors that mean the connection itself may be gone, as opposed to a failed request
+CONNECTION_ERRORS = (ConnectionError, TimeoutError, asyncio.TimeoutError)
+
+
+class UserSessionPool:
+    """
+    Long-lived user-account sessions shared by every restricted-content fetch.
+    Sessions connect once at startup and are handed out round-robin. A background task
+    pings each one every `health_interval` seconds and reconnects any that stopped answering.
+    pyrogram runs one file transfer per client at a time by default, so each session allows
+    enough for the parallel byte ranges of a download, or RESTRICTED_DOWNLOADS whole files.
+    """
+
+    def __init__(self, session_string=SESSION_STRING, size=USER_SESSION_POOL_SIZE, health_interval=USER_SESSION_HEALTH_INTERVAL):
+        self.session_string = session_string
+        self.health_interval = health_interval
+        self.sessions = [
+            Client(f"user_session_{i}", session_string=session_string, api_id=API_ID, api_hash=API_HASH,
+                   in_memory=True, no_updates=True,
+                   max_concurrent_transmissions=max(PARALLEL_DOWNLOAD_PARTS, RESTRICTED_DOWNLOADS))
+            for i in range(max(1, size))
+        ] if session_string else []
+        self._next = itertools.cycle(self.sessions)
+        self._locks = {id(acc): asyncio.Lock() for acc in self.sessions}
+        self._task = None
+
+    async def start(self):
+        for acc in self.sessions:
+            try:
+                await self._connect(acc)
+            except Exception as e:
+                logger.error(f"User session {acc.name} failed to connect: {e}")
+        if self.sessions and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._health_check())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        for acc in self.sessions:
+            if acc.is_connected:
+                try:
+                    await acc.disconnect()
+                except Exception:
+                    pass
+
+    async def _connect(self, acc):
+        async with self._locks[id(acc)]:
+            if not acc.is_connected:
+                await acc.connect()
+
+    async def reconnect(self, acc):
+        async with self._locks[id(acc)]:
+            if acc.is_connected:
+                try:
+                    await acc.disconnect()
+                except Exception:
+                    pass
+            await acc.connect()
+        logger.info(f"User session {acc.name} reconnected")
+
+    async def recover(self, acc):
+        """After a connection error, reconnect `acc` only if it no longer answers: other batches may be mid-transfer on it"""
+        try:
+            await asyncio.wait_for(acc.get_me(), timeout=30)
+        except Exception as e:
+            logger.warning(f"User session {acc.name} lost ({e}), reconnecting")
+            await self.reconnect(acc)
+
+    async def get(self):
+        """Next session of the pool, connected. Raises if no SESSION_STRING is configured."""
+        if not self.sessions:
+            raise RuntimeError("SESSION_STRING is not set")
+        acc = next(self._next)
+        if not acc.is_connected:
+            await self._connect(acc)
+        return acc
+
+    async def _health_check(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for acc in self.sessions:
+                try:
+                    await asyncio.wait_for(acc.get_me(), timeout=30)
+                except Exception as e:
+                    logger.warning(f"User session {acc.name} unhealthy ({e}), reconnecting")
+                    try:
+                        await self.reconnect(acc)
+                    except Exception as e:
+                        logger.error(f"User session {acc.name} failed to reconnect: {e}")
+
+
+user_sessions = UserSessionPool()